@@ -1,8 +1,15 @@
 import streamlit as st
-import pandas as pd
-from ics import Calendar
-from datetime import datetime, timedelta
-import re
+from datetime import datetime
+
+from faculty_core.calendar_tools import (
+    build_schedule_html,
+    events_on_or_after,
+    extract_course_codes,
+    filter_course_events,
+    parse_calendar,
+    shift_calendar,
+    shift_preview,
+)
 
 # --- PAGE SETUP ---
 st.set_page_config(page_title="Faculty Tools", page_icon="📚", layout="wide")
@@ -101,36 +108,17 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- CONSTANTS ---
-COURSE_PATTERN = r'([A-Z]{3,4}\s*[-]?\s*\d{4}(?:[\s-][A-Z0-9]{4,6})?)'
-
 # --- HELPER FUNCTIONS ---
 
 @st.cache_data
 def parse_calendar_file(file_contents):
     """Parse ICS calendar file with caching"""
     try:
-        return Calendar(file_contents)
+        return parse_calendar(file_contents)
     except Exception as e:
         st.error(f"Error reading calendar file: {str(e)}")
         return None
 
-def extract_course_codes(events):
-    """Extract unique course codes from calendar events"""
-    found_codes = []
-    for e in events:
-        found_codes.extend(re.findall(COURSE_PATTERN, e.name))
-        if e.description:
-            found_codes.extend(re.findall(COURSE_PATTERN, e.description))
-    
-    unique_raw = sorted(list(set(found_codes)), key=len, reverse=True)
-    course_codes = []
-    for code in unique_raw:
-        if not any(code in longer_code for longer_code in course_codes):
-            course_codes.append(code)
-    course_codes.sort()
-    return course_codes
-
 # --- MAIN APP ---
 
 st.title("Faculty Tools")
@@ -239,83 +227,15 @@ elif tool_choice == "Syllabus Schedule":
         if len(course_codes) > 1:
             st.info("Multiple sections found. Please select:")
             selected_course = st.selectbox("Select Class & Section:", course_codes)
-            filtered_events = [
-                e for e in all_events 
-                if selected_course in e.name or (e.description and selected_course in e.description)
-            ]
         elif len(course_codes) == 1:
             selected_course = course_codes[0]
-            filtered_events = [
-                e for e in all_events 
-                if selected_course in e.name or (e.description and selected_course in e.description)
-            ]
-        else:
-            filtered_events = all_events
+        filtered_events = filter_course_events(all_events, selected_course)
 
         # Filter events by start date
-        start_date_obj = start_date.date() if hasattr(start_date, 'date') else start_date
-        events = sorted(
-            [e for e in filtered_events if e.begin.date() >= start_date_obj],
-            key=lambda x: x.begin
-        )
+        events = events_on_or_after(filtered_events, start_date)
 
         if events:
-            html_output = ["<div style='font-family: sans-serif; max-width: 800px; margin: 0 auto;'>"]
-            
-            if class_format in ["Hybrid", "Online"]:
-                # Group by week
-                events_by_week = {}
-                for e in events:
-                    monday = e.begin.date() - timedelta(days=e.begin.date().weekday())
-                    if monday not in events_by_week:
-                        events_by_week[monday] = []
-                    events_by_week[monday].append(e)
-                
-                for week_start in sorted(events_by_week.keys()):
-                    week_events = events_by_week[week_start]
-                    is_break = any(
-                        "break" in x.name.lower() or "holiday" in x.name.lower() 
-                        for x in week_events
-                    )
-                    week_num = ((week_start - start_date_obj).days // 7) + 1
-                    
-                    if is_break:
-                        label = f"Week {week_num} (Break)"
-                    else:
-                        label = f"Week {week_num}: {week_start.strftime('%b %d')}"
-                    
-                    html_output.append(
-                        f"<div style='border:1px solid #ccc; padding:15px; margin-bottom:15px; "
-                        f"border-radius:5px;'><h3>{label}</h3><ul>"
-                    )
-                    
-                    for e in week_events:
-                        display_name = (
-                            e.name.replace(selected_course, "").strip(": ") 
-                            if selected_course else e.name
-                        )
-                        style = (
-                            "color:#900; font-weight:bold;" 
-                            if "due" in display_name.lower() 
-                            else "color:#333;"
-                        )
-                        html_output.append(f"<li style='{style}'>{display_name}</li>")
-                    
-                    html_output.append("</ul></div>")
-            else:
-                # In-person format
-                for e in events:
-                    display_name = (
-                        e.name.replace(selected_course, "").strip(": ") 
-                        if selected_course else e.name
-                    )
-                    html_output.append(
-                        f"<div style='border-bottom:1px solid #eee; padding:10px;'>"
-                        f"<strong>{e.begin.format('ddd, MMM D')}:</strong> {display_name}</div>"
-                    )
-            
-            html_output.append("</div>")
-            final_html = "\n".join(html_output)
+            final_html = build_schedule_html(events, start_date, class_format, selected_course)
             
             st.success("Schedule generated successfully!")
             st.code(final_html, language="html")
@@ -384,29 +304,14 @@ elif tool_choice == "Date Shifter & Calculator":
         # Show preview of changes
         st.markdown("### Preview of Changes")
         
-        sample_events = list(calendar.events)[:5]  # Show first 5 events
-        preview_data = []
-        
-        for e in sample_events:
-            old_date = e.begin.format('YYYY-MM-DD HH:mm')
-            new_date = (e.begin + timedelta(days=final_shift)).format('YYYY-MM-DD HH:mm')
-            preview_data.append({
-                "Event": e.name[:50] + "..." if len(e.name) > 50 else e.name,
-                "Old Date": old_date,
-                "New Date": new_date
-            })
+        preview_data = shift_preview(calendar.events, final_shift)  # Show first 5 events
         
         if preview_data:
-            st.table(pd.DataFrame(preview_data))
+            st.table(preview_data)
         
         if st.button(f"Generate Shifted ICS (+{final_shift} days)", type="primary"):
             with st.spinner("Shifting dates..."):
-                new_calendar = Calendar()
-                
-                for e in calendar.events:
-                    e.begin += timedelta(days=final_shift)
-                    e.end += timedelta(days=final_shift)
-                    new_calendar.events.add(e)
+                new_calendar = shift_calendar(calendar, final_shift)
                 
                 st.success(f"Shifted {len(calendar.events)} events by {final_shift} days!")
                 
@@ -0,0 +1,103 @@
+"""Benchmark the pypdf and PyMuPDF merge backends on a course packet
+
+Builds a packet of synthetic readings (files x pages each) with a few pages
+cropped, references every page with a few rotated, then merges it with a TOC
+and page numbers on each backend and reports wall time, the part of it spent
+numbering pages, tracemalloc peak and output size. The backends' outputs must
+have the same words in the same places on every page.
+
+    python benchmarks/bench_merge.py --files 50 --pages-per-file 20
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import make_course_reader  # noqa: E402
+from faculty_core.pdf_merge import MERGE_BACKENDS, PdfSource, extract_pages_from_pdf, merge_pdfs  # noqa: E402
+
+
+def crop_pages(pdf_bytes, crop_every, margin=36):
+    """Crop every Nth page by margin points on each side"""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        # Starts at page 0 like the rotations, so some pages are both
+        for page_index in range(0, doc.page_count, crop_every):
+            page = doc[page_index]
+            page.set_cropbox(page.mediabox + (margin, margin, -margin, -margin))
+        return doc.tobytes()
+
+
+def make_packet(files, pages_per_file, rotate_every, crop_every):
+    """(pdf_list, sources) as the PDF editor builds them from uploads"""
+    pdf_list = []
+    sources = {}
+    for file_index in range(files):
+        pdf_bytes = crop_pages(make_course_reader(pages_per_file, seed=file_index), crop_every)
+        source = PdfSource(pdf_bytes, f"reading-{file_index + 1}.pdf")
+        sources[source.source_id] = source
+        pages = extract_pages_from_pdf(source)
+        for page in pages[::rotate_every]:
+            page['rotation'] = 90
+        pdf_list.append({'toc_title': f"Reading {file_index + 1}", 'pages': pages})
+    return pdf_list, sources
+
+
+def measure(pdf_list, sources, backend, repeat, page_num_position='bottom-center'):
+    """Best wall time, peak traced memory and output for merging the packet"""
+    best_time = None
+    peak = 0
+    output = b''
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        output = merge_pdfs(pdf_list, sources, page_num_position=page_num_position, backend=backend)
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    return best_time, peak, output
+
+
+def page_words(pdf_bytes):
+    """Per page, the visible words with positions rounded to whole points"""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [sorted((word[4], round(word[0]), round(word[1])) for word in page.get_text("words"))
+                for page in doc]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--pages-per-file', type=int, default=20)
+    parser.add_argument('--rotate-every', type=int, default=7, help="Rotate every Nth page of each file")
+    parser.add_argument('--crop-every', type=int, default=5, help="Crop every Nth page of each file")
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    pdf_list, sources = make_packet(args.files, args.pages_per_file, args.rotate_every, args.crop_every)
+    total_pages = args.files * args.pages_per_file
+    input_bytes = sum(len(source.pdf_bytes) for source in sources.values())
+    print(f"{args.files} files, {total_pages} pages, {input_bytes / 1e6:.1f} MB input")
+
+    print(f"{'backend':<10}{'time (s)':>10}{'numbering':>11}{'peak (MB)':>12}{'output (MB)':>14}")
+    results = {}
+    words = {}
+    for backend in MERGE_BACKENDS:
+        elapsed, peak, output = measure(pdf_list, sources, backend, args.repeat)
+        unnumbered, _, _ = measure(pdf_list, sources, backend, args.repeat, page_num_position='none')
+        words[backend] = page_words(output)
+        results[backend] = elapsed
+        print(f"{backend:<10}{elapsed:>10.3f}{elapsed - unnumbered:>11.3f}"
+              f"{peak / 1e6:>12.2f}{len(output) / 1e6:>14.2f}")
+    assert words['pypdf'] == words['pymupdf'], "backends must put the same words in the same places"
+    print(f"pymupdf took {results['pymupdf'] / results['pypdf']:.2f}x the pypdf time")
+
+
+if __name__ == '__main__':
+    main()
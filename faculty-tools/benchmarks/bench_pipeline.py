@@ -0,0 +1,287 @@
+"""Scale benchmark for the PDF to HTML pipeline, stage by stage
+
+Generates synthetic course readers (chapter and section headings, bulleted
+and numbered lists, running headers/footers, paragraphs that continue across
+page breaks) at several sizes and times every stage from analyze_pdf_structure
+through generate_canvas_html. A second pass under tracemalloc records the
+peak traced memory of each stage.
+
+Results are compared with benchmarks/baselines/pipeline.json when it has an
+entry for the size; any stage slower or larger than its baseline by more than
+the tolerance fails the run with exit status 1.
+
+    python benchmarks/bench_pipeline.py --sizes 10,100,1000
+    python benchmarks/bench_pipeline.py --sizes 10,100,1000,5000 --save-baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import fitz  # PyMuPDF
+import numpy  # noqa: F401  (imported here so its load time isn't charged to a stage)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faculty_core.pdf_html import (  # noqa: E402
+    analyze_pdf_structure,
+    detect_heading_hierarchy,
+    generate_canvas_html,
+    generate_standalone_html,
+    merge_consecutive_headings,
+    normalize_heading_hierarchy,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'pipeline.json')
+
+DEFAULT_SIZES = '10,100,1000,5000'
+
+# Absolute slack so millisecond stages on tiny documents don't flap
+MIN_SECONDS_SLACK = 0.05
+MIN_PEAK_SLACK_MB = 1.0
+
+WORDS = ("students writing draft revise source claim evidence audience reader "
+         "paragraph argument thesis citation research genre rhetorical context "
+         "feedback peer review process revision analysis").split()
+
+PAGE_TOP = 110  # below the running-header band
+PAGE_BOTTOM = 730
+LINE_HEIGHT = 14
+
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_course_reader(pages, chapter_every=10, section_every=2, list_every=3,
+                       running_headers=True, carry_paragraphs=True, outline=False, seed=1):
+    """Letter-size synthetic reader exercising every pipeline stage
+
+    Text goes through one TextWriter per page, which is several times faster
+    than page.insert_text per line at thousands of pages.
+    """
+    rng = random.Random(seed)
+    fonts = {name: fitz.Font(name) for name in ('helv', 'hebo', 'tiro', 'tiit')}
+    doc = fitz.open()
+    toc = []
+    for page_index in range(pages):
+        page_num = page_index + 1
+        page = doc.new_page()
+        writer = fitz.TextWriter(page.rect)
+        chapter = page_index // chapter_every + 1
+
+        def write(x, y, text, fontname='tiro', fontsize=11):
+            writer.append((x, y), text, font=fonts[fontname], fontsize=fontsize)
+
+        if running_headers:
+            write(72, 40, f"COMPOSITION READER  |  CHAPTER {chapter}", 'helv', 9)
+            write(300, 770, str(page_num), 'helv', 9)
+
+        y = PAGE_TOP
+        if carry_paragraphs and page_index % chapter_every:
+            # Finish the sentence left open at the bottom of the previous page
+            write(72, y, sentence(rng, 8) + ".")
+            y += LINE_HEIGHT
+
+        if page_index % chapter_every == 0:
+            title = f"Chapter {chapter}: Writing in Context"
+            write(72, y, title, 'hebo', 22)
+            toc.append([1, title, page_num])
+            y += 40
+            # Short introduction so the chapter and section titles stay apart
+            for _ in range(3):
+                write(72, y, sentence(rng))
+                y += LINE_HEIGHT
+            y += LINE_HEIGHT
+        if page_index % section_every == 0:
+            title = f"Section {chapter}.{page_index % chapter_every // section_every + 1}: Working with Sources"
+            write(72, y, title, 'hebo', 16)
+            toc.append([2, title, page_num])
+            y += 28
+
+        line = 0
+        while y < PAGE_BOTTOM - LINE_HEIGHT:
+            if page_index % list_every == 0 and 6 <= line < 12:
+                marker = "•" if line < 9 else f"{line - 8}."
+                write(86, y, f"{marker} {sentence(rng, 9)}")
+            else:
+                text = sentence(rng)
+                if line % 5 == 4:
+                    text += "."
+                write(72, y, text, 'tiit' if line % 11 == 7 else 'tiro')
+            y += LINE_HEIGHT
+            line += 1
+
+        # Last line either closes the paragraph or runs onto the next page
+        last = sentence(rng, 10)
+        next_is_chapter = (page_index + 1) % chapter_every == 0
+        if not carry_paragraphs or next_is_chapter:
+            last += "."
+        write(72, y, last)
+        writer.write_text(page)
+
+    if outline:
+        doc.set_toc(toc)
+    # garbage=3 folds the per-page font copies back into one
+    pdf_bytes = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return pdf_bytes
+
+
+def run_pipeline(pdf_bytes, parallel, traced):
+    """Run every stage once; return {stage: {'seconds', 'count'[, 'peak_mb']}}
+
+    count is the number of elements a stage returned, or the length of the
+    HTML for the output stages.
+    """
+    results = {}
+
+    def stage(name, func, *args):
+        if traced:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        value = func(*args)
+        stats = {'seconds': round(time.perf_counter() - start, 4), 'count': len(value)}
+        if traced:
+            stats['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+        results[name] = stats
+        return value
+
+    elements = stage('extract', analyze_pdf_structure, pdf_bytes, parallel)
+    elements = stage('detect_hierarchy', detect_heading_hierarchy, elements)
+    elements = stage('merge_headings', merge_consecutive_headings, elements)
+    elements = stage('redetect_hierarchy', detect_heading_hierarchy, elements)
+    elements = stage('normalize', normalize_heading_hierarchy, elements)
+    stage('standalone_html', generate_standalone_html, elements, "Benchmark Reader")
+    stage('canvas_html', generate_canvas_html, elements)
+    return results
+
+
+def measure(pdf_bytes, parallel, repeat, memory):
+    """Best-of-repeat stage times, plus per-stage peaks from one traced run"""
+    stages = None
+    for _ in range(repeat):
+        run = run_pipeline(pdf_bytes, parallel, traced=False)
+        if stages is None:
+            stages = run
+        else:
+            for name, stats in run.items():
+                stages[name]['seconds'] = min(stages[name]['seconds'], stats['seconds'])
+
+    if memory:
+        tracemalloc.start()
+        traced = run_pipeline(pdf_bytes, parallel, traced=True)
+        tracemalloc.stop()
+        for name, stats in traced.items():
+            stages[name]['peak_mb'] = stats['peak_mb']
+    return stages
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(stages, baseline_stages, tolerance):
+    """Messages for stages that exceed their baseline by more than tolerance"""
+    problems = []
+    for name, stats in stages.items():
+        base = baseline_stages.get(name)
+        if not base:
+            continue
+        limit = base['seconds'] * (1 + tolerance) + MIN_SECONDS_SLACK
+        if stats['seconds'] > limit:
+            problems.append(f"{name}: {stats['seconds']:.3f}s > {limit:.3f}s "
+                            f"(baseline {base['seconds']:.3f}s)")
+        if 'peak_mb' in stats and 'peak_mb' in base:
+            limit = base['peak_mb'] * (1 + tolerance) + MIN_PEAK_SLACK_MB
+            if stats['peak_mb'] > limit:
+                problems.append(f"{name}: peak {stats['peak_mb']:.1f} MB > {limit:.1f} MB "
+                                f"(baseline {base['peak_mb']:.1f} MB)")
+    return problems
+
+
+def print_table(pages, stages):
+    print(f"\n{pages} pages")
+    print(f"  {'stage':<20}{'time (s)':>10}{'peak (MB)':>12}{'count':>10}")
+    for name, stats in stages.items():
+        peak = f"{stats['peak_mb']:>12.1f}" if 'peak_mb' in stats else f"{'-':>12}"
+        print(f"  {name:<20}{stats['seconds']:>10.3f}{peak}{stats['count']:>10}")
+    total = sum(stats['seconds'] for stats in stages.values())
+    print(f"  {'total':<20}{total:>10.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated page counts")
+    parser.add_argument('--repeat', type=int, default=1, help="Timing runs per size (best is kept)")
+    parser.add_argument('--chapter-every', type=int, default=10, help="Pages per chapter (H1)")
+    parser.add_argument('--section-every', type=int, default=2, help="Pages per section (H2)")
+    parser.add_argument('--list-every', type=int, default=3, help="Put a list on every Nth page")
+    parser.add_argument('--no-running-headers', action='store_true')
+    parser.add_argument('--no-carry-paragraphs', action='store_true',
+                        help="Close every paragraph before the page break")
+    parser.add_argument('--outline', action='store_true', help="Embed a bookmark outline")
+    parser.add_argument('--parallel', action='store_true', help="Extract with the process pool")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Allowed slowdown/growth over baseline, as a fraction")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Write these results as the new baseline instead of checking")
+    parser.add_argument('--json', default=None, help="Also write results to this file")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    baseline = load_baseline(args.baseline)
+    results = {}
+    failures = []
+
+    for pages in sizes:
+        start = time.perf_counter()
+        pdf_bytes = make_course_reader(
+            pages, args.chapter_every, args.section_every, args.list_every,
+            running_headers=not args.no_running_headers,
+            carry_paragraphs=not args.no_carry_paragraphs,
+            outline=args.outline,
+        )
+        print(f"generated {pages}-page reader ({len(pdf_bytes) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        stages = measure(pdf_bytes, args.parallel, args.repeat, memory=not args.no_memory)
+        results[str(pages)] = stages
+        print_table(pages, stages)
+
+        if not args.save_baseline and str(pages) in baseline:
+            for problem in regressions(stages, baseline[str(pages)], args.tolerance):
+                failures.append(f"{pages} pages, {problem}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        baseline.update(results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+
+    if failures:
+        print("\nREGRESSIONS:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Benchmark text-only get_text("dict") against the default on image-heavy PDFs
+
+Builds a synthetic handout with full-page-width images on every page, then
+extracts text blocks both ways and reports wall time and tracemalloc peak.
+
+    python benchmarks/bench_text_extraction.py --pages 50 --images-per-page 2
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from faculty_core.extraction import get_text_blocks  # noqa: E402
+
+
+def make_image_heavy_pdf(pages, images_per_page, image_px):
+    """Letter-size pages with a few lines of text and large RGB images"""
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Handout page {page_num + 1}", fontsize=16)
+        page.insert_text((72, 100), "Scanned figure and caption text for benchmarking.", fontsize=11)
+
+        slot_height = (792 - 200) / images_per_page
+        for i in range(images_per_page):
+            # Random samples stand in for scanned content and keep images distinct
+            pix = fitz.Pixmap(fitz.csRGB, image_px, image_px, os.urandom(image_px * image_px * 3), False)
+            top = 120 + i * slot_height
+            page.insert_image(fitz.Rect(72, top, 540, top + slot_height - 10),
+                              stream=pix.tobytes("jpg"))
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+
+def measure(pdf_bytes, text_only, repeat):
+    """Best wall time and peak traced memory for extracting every page"""
+    best_time = None
+    peak = 0
+    blocks_seen = 0
+    for _ in range(repeat):
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        tracemalloc.start()
+        start = time.perf_counter()
+        blocks_seen = 0
+        for page in doc:
+            blocks_seen += len(get_text_blocks(page, text_only=text_only))
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        doc.close()
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    return best_time, peak, blocks_seen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--images-per-page', type=int, default=2)
+    parser.add_argument('--image-px', type=int, default=800, help="Width/height of each image in pixels")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    pdf_bytes = make_image_heavy_pdf(args.pages, args.images_per_page, args.image_px)
+    print(f"{args.pages} pages, {args.images_per_page} images/page, "
+          f"{len(pdf_bytes) / 1e6:.1f} MB PDF")
+
+    default_time, default_peak, default_blocks = measure(pdf_bytes, False, args.repeat)
+    text_time, text_peak, text_blocks = measure(pdf_bytes, True, args.repeat)
+    assert default_blocks == text_blocks, "text-only mode must return the same text blocks"
+
+    print(f"{'mode':<12}{'time (s)':>10}{'peak (MB)':>12}")
+    print(f"{'default':<12}{default_time:>10.3f}{default_peak / 1e6:>12.2f}")
+    print(f"{'text-only':<12}{text_time:>10.3f}{text_peak / 1e6:>12.2f}")
+    print(f"saved {100 * (1 - text_time / default_time):.0f}% time, "
+          f"{100 * (1 - text_peak / max(default_peak, 1)):.0f}% peak memory")
+
+
+if __name__ == '__main__':
+    main()
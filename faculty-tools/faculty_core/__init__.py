@@ -0,0 +1,21 @@
+"""Headless core of the faculty tools
+
+Pure-Python functions behind the Streamlit apps, importable by workers, CLIs
+and benchmarks without starting Streamlit:
+
+- pdf_html: PDF to accessible/Canvas HTML pipeline (pdf-to-html.py)
+- pdf_tagging: heading detection for the accessibility tagger (pdf-accessibility.py)
+- pdf_merge: page extraction, merging, TOC and page numbers (pdf-tool.py)
+- thumbnails: on-demand, cached page thumbnails rendered in the background
+- calendar_tools: course codes, schedules and date shifting for .ics files (app.py)
+- extraction, text_elements, analysis_cache: shared building blocks
+- analysis_worker: background pdf_html analysis with progress and cancel
+- review: element IDs, search and paging for the tag review steps
+- html_sections: per-section HTML fragments for incremental regeneration
+- tag_rules: rule-based bulk retagging ("14pt bold -> H2") for the tagger
+- instrumentation: optional per-stage timing/memory records (StageRecorder)
+- batch: command-line PDF to HTML conversion (python -m faculty_core.batch)
+
+Heavy dependencies (fitz, pypdf, reportlab, numpy, ics) are imported on first
+use, so importing a module only costs what its callers actually touch.
+"""
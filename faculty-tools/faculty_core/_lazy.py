@@ -0,0 +1,22 @@
+"""Deferred imports for heavy dependencies"""
+
+import importlib
+
+
+class LazyModule:
+    """Stand-in for a module that is only imported on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        # import_module is a dict lookup once the module is in sys.modules
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self):
+        return f'<lazy module {self._name!r}>'
+
+
+def lazy_import(name):
+    """Return a LazyModule for name, e.g. fitz = lazy_import('fitz')"""
+    return LazyModule(name)
@@ -0,0 +1,97 @@
+# analysis_cache.py
+"""Content-addressed on-disk cache of PDF analysis results
+
+Entries are keyed by a SHA-256 of the PDF bytes plus the tool name and its
+pipeline version, so re-uploading the same file (a page refresh, or reopening
+the tool the next day) loads the analysed elements instead of re-parsing the
+PDF. Bump a tool's pipeline version whenever its analysis output changes.
+
+The cache is capped in size; least recently used entries are evicted first.
+Any cache failure is treated as a miss so the tools keep working without it.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+CACHE_DIR = os.environ.get(
+    'FACULTY_TOOLS_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'faculty-tools', 'analysis')
+)
+CACHE_MAX_BYTES = int(os.environ.get('FACULTY_TOOLS_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+CACHE_SUFFIX = '.pkl'
+
+
+def cache_key(pdf_bytes, tool, version):
+    """Hash of the PDF contents and the pipeline that analysed it"""
+    digest = hashlib.sha256()
+    digest.update(f'{tool}:{version}:'.encode())
+    digest.update(pdf_bytes)
+    return digest.hexdigest()
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, key + CACHE_SUFFIX)
+
+
+def load_cached_analysis(pdf_bytes, tool, version, cache_dir=CACHE_DIR):
+    """Return the cached elements for this PDF, or None on a miss"""
+    path = _cache_path(cache_key(pdf_bytes, tool, version), cache_dir)
+    try:
+        with open(path, 'rb') as f:
+            elements = pickle.load(f)
+        # Mark as recently used for LRU eviction
+        os.utime(path)
+        return elements
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # Unreadable or written by incompatible code - drop it
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+def store_cached_analysis(pdf_bytes, tool, version, elements,
+                          cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Save analysed elements for this PDF, then evict old entries over the cap"""
+    path = _cache_path(cache_key(pdf_bytes, tool, version), cache_dir)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(list(elements), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        evict_cache(cache_dir, max_bytes)
+    except OSError:
+        pass
+
+
+def evict_cache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Remove least recently used entries until the cache fits in max_bytes"""
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(CACHE_SUFFIX) and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,113 @@
+# analysis_worker.py
+"""Run analyze_pdf_document in a background thread with progress and cancel
+
+The Streamlit page starts an AnalysisWorker, keeps it in session state and
+polls it on each rerun: pages_done/page_count drive a progress bar,
+provisional_outline() previews the headings found so far, and cancel() stops
+extraction at the next page. When done is set, result holds the same
+elements analyze_pdf_document would have returned.
+"""
+
+import threading
+from collections import Counter
+
+from .extraction import page_range_indices, pdf_page_count
+from .instrumentation import NULL_RECORDER
+from .pdf_html import analyze_pdf_document, line_size_counts
+
+# Provisional headings: only short lines are candidates, and only this many
+# are kept per font size so the preview stays small on huge documents
+PROVISIONAL_MAX_CHARS = 150
+PROVISIONAL_MAX_PER_SIZE = 200
+# Same 2pt-above-body rule as heading_size_tiers, capped at three levels
+PROVISIONAL_MIN_GAP = 1.5
+PROVISIONAL_LEVELS = ['H1', 'H2', 'H3']
+
+
+class AnalysisCancelled(Exception):
+    """Raised inside the worker thread to stop extraction early"""
+
+
+class AnalysisWorker:
+    """One background analysis of one PDF"""
+
+    def __init__(self, pdf_bytes, low_memory=False, recorder=NULL_RECORDER, page_range=None):
+        self.pdf_bytes = pdf_bytes
+        self.low_memory = low_memory
+        self.recorder = recorder
+        self.page_range = page_range
+        # Pages this run will extract, for the progress bar
+        self.page_count = len(page_range_indices(page_range, pdf_page_count(pdf_bytes)))
+
+        self.pages_done = 0
+        self.phase = 'extracting'
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.done = False
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._size_counts = Counter()
+        self._candidates = {}
+        self._thread = threading.Thread(target=self._run, name='pdf-analysis', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Ask the worker to stop; it finishes with cancelled=True"""
+        self._cancel.set()
+
+    def _progress(self, pages_done, new_lines):
+        if self._cancel.is_set():
+            raise AnalysisCancelled()
+        with self._lock:
+            self._size_counts.update(line_size_counts(new_lines))
+            for line in new_lines:
+                if line['char_count'] <= PROVISIONAL_MAX_CHARS:
+                    bucket = self._candidates.setdefault(round(line['font_size'] * 2) / 2, [])
+                    if len(bucket) < PROVISIONAL_MAX_PER_SIZE:
+                        bucket.append((line['page'], line['y_position'], line['text']))
+            self.pages_done = pages_done
+        if pages_done >= self.page_count:
+            self.phase = 'detecting headings'
+
+    def _run(self):
+        try:
+            # Extraction stays in this thread: no process pool is started
+            # from inside the server, and progress/cancel work per page
+            result = analyze_pdf_document(self.pdf_bytes, low_memory=self.low_memory, parallel=False,
+                                          recorder=self.recorder, progress=self._progress,
+                                          page_range=self.page_range)
+            if self._cancel.is_set():
+                self.cancelled = True
+            else:
+                self.result = result
+        except AnalysisCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            self.phase = 'done'
+            self.done = True
+
+    def provisional_outline(self, limit=100):
+        """(tag, page, text) guesses from the pages extracted so far
+
+        Sizes well above the most common size so far become H1-H3, largest
+        first. This is only a preview; the final outline comes from the full
+        heading detection.
+        """
+        with self._lock:
+            if not self._size_counts:
+                return []
+            body_size = self._size_counts.most_common(1)[0][0]
+            heading_sizes = sorted((size for size in self._candidates
+                                    if size > body_size + PROVISIONAL_MIN_GAP), reverse=True)
+            outline = []
+            for tag, size in zip(PROVISIONAL_LEVELS, heading_sizes):
+                outline.extend((page, y, tag, text) for page, y, text in self._candidates[size])
+        outline.sort()
+        return [(tag, page, text) for page, _, tag, text in outline[:limit]]
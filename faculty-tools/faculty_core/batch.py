@@ -0,0 +1,202 @@
+# batch.py
+"""Convert a directory or glob of PDFs to accessible or Canvas HTML
+
+Runs the same pipeline as pdf-to-html.py, one document per worker process,
+and writes one .html per PDF plus a JSON summary of timings and heading
+counts next to them.
+
+    python -m faculty_core.batch readings/ -o html/
+    python -m faculty_core.batch "readings/**/*.pdf" -o html/ --format canvas --workers 8
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .analysis_cache import load_cached_analysis, store_cached_analysis
+from .extraction import pdf_page_count
+from .pdf_html import (
+    HTML_EMITTERS,
+    PIPELINE_VERSION,
+    analyze_pdf_document,
+    document_title,
+    spool_pdf_document,
+    write_html,
+)
+
+FORMATS = tuple(HTML_EMITTERS)
+
+SUMMARY_FILENAME = 'summary.json'
+
+
+def find_pdfs(inputs, recursive=False):
+    """Expand directories and glob patterns into a sorted list of PDF paths"""
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            # Any name; the extension check below is case-insensitive (Reading.PDF)
+            pattern = os.path.join(item, '**', '*') if recursive else os.path.join(item, '*')
+            matches = glob.glob(pattern, recursive=recursive)
+        else:
+            matches = glob.glob(item, recursive=True)
+        found.update(os.path.abspath(m) for m in matches
+                     if m.lower().endswith('.pdf') and os.path.isfile(m))
+    return sorted(found)
+
+
+def output_paths(pdf_paths, output_dir):
+    """Map each PDF to an .html path, mirroring folders below their common root"""
+    if not pdf_paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(p) for p in pdf_paths])
+    return {
+        path: os.path.join(output_dir, os.path.splitext(os.path.relpath(path, root))[0] + '.html')
+        for path in pdf_paths
+    }
+
+
+def heading_counts(elements):
+    """Number of elements per heading level"""
+    counts = {'H1': 0, 'H2': 0, 'H3': 0}
+    for elem in elements:
+        if elem['user_tag'] in counts:
+            counts[elem['user_tag']] += 1
+    return counts
+
+
+def convert_pdf(pdf_path, html_path, output_format='standalone', use_cache=True, low_memory=False):
+    """Convert one PDF and return its summary record
+
+    Errors are caught and reported in the record so one broken file doesn't
+    stop an overnight run.
+    """
+    record = {'pdf': pdf_path, 'html': html_path, 'format': output_format}
+    start = time.perf_counter()
+    # Analysis runs in this process (parallel=False), so this is the file's CPU time
+    cpu_start = time.process_time()
+    try:
+        with open(pdf_path, 'rb') as f:
+            pdf_bytes = f.read()
+        record['bytes'] = len(pdf_bytes)
+
+        analyze_start = time.perf_counter()
+        if low_memory:
+            # Elements are spooled to a temp file and written out from there,
+            # never held as a list; the cache stores whole lists, so it's skipped
+            elements = spool_pdf_document(pdf_bytes)
+            record['cached'] = False
+        else:
+            elements = load_cached_analysis(pdf_bytes, 'pdf-to-html', PIPELINE_VERSION) if use_cache else None
+            record['cached'] = elements is not None
+        if elements is None:
+            # One document per worker already fills the pool
+            elements = analyze_pdf_document(pdf_bytes, parallel=False)
+            if use_cache:
+                store_cached_analysis(pdf_bytes, 'pdf-to-html', PIPELINE_VERSION, elements)
+        record['analyze_seconds'] = round(time.perf_counter() - analyze_start, 3)
+
+        # Rendered straight into the output file
+        render_start = time.perf_counter()
+        title = document_title(elements, os.path.splitext(os.path.basename(pdf_path))[0])
+        os.makedirs(os.path.dirname(html_path) or '.', exist_ok=True)
+        with open(html_path, 'w', encoding='utf-8') as f:
+            record['html_chars'] = write_html(elements, f, HTML_EMITTERS[output_format], title)
+        record['render_seconds'] = round(time.perf_counter() - render_start, 3)
+
+        record['elements'] = len(elements)
+        record['pages'] = pdf_page_count(pdf_bytes)
+        record['headings'] = heading_counts(elements)
+        record['ok'] = True
+    except Exception as e:
+        record['ok'] = False
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['total_seconds'] = round(time.perf_counter() - start, 3)
+    record['cpu_seconds'] = round(time.process_time() - cpu_start, 3)
+    return record
+
+
+def convert_all(pdf_paths, output_dir, output_format='standalone', workers=None,
+                use_cache=True, low_memory=False, progress=None):
+    """Convert PDFs across a process pool; records come back in input order"""
+    targets = output_paths(pdf_paths, output_dir)
+    records = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(convert_pdf, path, targets[path], output_format, use_cache, low_memory): path
+            for path in pdf_paths
+        }
+        for future in as_completed(futures):
+            record = future.result()
+            records[futures[future]] = record
+            if progress:
+                progress(len(records), len(pdf_paths), record)
+    return [records[path] for path in pdf_paths]
+
+
+def summarize(records, wall_seconds):
+    """Totals for the JSON summary"""
+    converted = [r for r in records if r['ok']]
+    totals = {'H1': 0, 'H2': 0, 'H3': 0}
+    for record in converted:
+        for tag, count in record['headings'].items():
+            totals[tag] += count
+    return {
+        'files': len(records),
+        'converted': len(converted),
+        'failed': len(records) - len(converted),
+        'wall_seconds': round(wall_seconds, 3),
+        'cpu_seconds': round(sum(r['cpu_seconds'] for r in records), 3),
+        'headings': totals,
+    }
+
+
+def _print_progress(done, total, record):
+    status = 'ok' if record['ok'] else f"FAILED ({record['error']})"
+    print(f"[{done}/{total}] {os.path.basename(record['pdf'])}: {status} "
+          f"in {record['total_seconds']:.1f}s", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('inputs', nargs='+', help="PDF files, directories or glob patterns")
+    parser.add_argument('-o', '--output-dir', required=True)
+    parser.add_argument('--format', choices=FORMATS, default='standalone',
+                        help="standalone: full page with CSS; canvas: fragment with headers starting at H2; "
+                             "-compact variants drop indentation and redundant whitespace")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--recursive', action='store_true', help="Search directories recursively")
+    parser.add_argument('--no-cache', action='store_true', help="Don't read or write the analysis cache")
+    parser.add_argument('--low-memory', action='store_true', help="Analyze each PDF one page at a time and write its HTML from a temp-file "
+                             "spool, keeping memory flat (skips the analysis cache)")
+    parser.add_argument('--summary', default=None,
+                        help=f"Path for the JSON summary (default: OUTPUT_DIR/{SUMMARY_FILENAME})")
+    args = parser.parse_args(argv)
+
+    pdf_paths = find_pdfs(args.inputs, recursive=args.recursive)
+    if not pdf_paths:
+        parser.error("no PDF files found")
+
+    start = time.perf_counter()
+    records = convert_all(pdf_paths, args.output_dir, args.format, args.workers,
+                          use_cache=not args.no_cache, low_memory=args.low_memory,
+                          progress=_print_progress)
+    summary = summarize(records, time.perf_counter() - start)
+    summary['format'] = args.format
+    summary['documents'] = records
+
+    summary_path = args.summary or os.path.join(args.output_dir, SUMMARY_FILENAME)
+    os.makedirs(os.path.dirname(summary_path) or '.', exist_ok=True)
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Converted {summary['converted']}/{summary['files']} PDFs in {summary['wall_seconds']:.1f}s; "
+          f"summary written to {summary_path}", file=sys.stderr)
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# calendar_tools.py
+"""Syllabus schedule and date shifting helpers for .ics calendar files"""
+
+import re
+from datetime import timedelta
+
+from ._lazy import lazy_import
+
+ics = lazy_import('ics')
+
+# --- CONSTANTS ---
+COURSE_PATTERN = r'([A-Z]{3,4}\s*[-]?\s*\d{4}(?:[\s-][A-Z0-9]{4,6})?)'
+
+
+def parse_calendar(file_contents):
+    """Parse ICS calendar text into an ics.Calendar"""
+    return ics.Calendar(file_contents)
+
+
+def extract_course_codes(events):
+    """Extract unique course codes from calendar events"""
+    found_codes = []
+    for e in events:
+        found_codes.extend(re.findall(COURSE_PATTERN, e.name))
+        if e.description:
+            found_codes.extend(re.findall(COURSE_PATTERN, e.description))
+
+    unique_raw = sorted(list(set(found_codes)), key=len, reverse=True)
+    course_codes = []
+    for code in unique_raw:
+        if not any(code in longer_code for longer_code in course_codes):
+            course_codes.append(code)
+    course_codes.sort()
+    return course_codes
+
+
+def filter_course_events(events, course):
+    """Events that mention the course code in their name or description"""
+    if not course:
+        return list(events)
+    return [
+        e for e in events
+        if course in e.name or (e.description and course in e.description)
+    ]
+
+
+def events_on_or_after(events, start_date):
+    """Events beginning on or after start_date, in date order"""
+    start_date_obj = start_date.date() if hasattr(start_date, 'date') else start_date
+    return sorted(
+        [e for e in events if e.begin.date() >= start_date_obj],
+        key=lambda x: x.begin
+    )
+
+
+def build_schedule_html(events, start_date, class_format, selected_course=None):
+    """Syllabus schedule HTML, grouped by week for Hybrid/Online classes"""
+    start_date_obj = start_date.date() if hasattr(start_date, 'date') else start_date
+    html_output = ["<div style='font-family: sans-serif; max-width: 800px; margin: 0 auto;'>"]
+
+    if class_format in ["Hybrid", "Online"]:
+        # Group by week
+        events_by_week = {}
+        for e in events:
+            monday = e.begin.date() - timedelta(days=e.begin.date().weekday())
+            if monday not in events_by_week:
+                events_by_week[monday] = []
+            events_by_week[monday].append(e)
+
+        for week_start in sorted(events_by_week.keys()):
+            week_events = events_by_week[week_start]
+            is_break = any(
+                "break" in x.name.lower() or "holiday" in x.name.lower()
+                for x in week_events
+            )
+            week_num = ((week_start - start_date_obj).days // 7) + 1
+
+            if is_break:
+                label = f"Week {week_num} (Break)"
+            else:
+                label = f"Week {week_num}: {week_start.strftime('%b %d')}"
+
+            html_output.append(
+                f"<div style='border:1px solid #ccc; padding:15px; margin-bottom:15px; "
+                f"border-radius:5px;'><h3>{label}</h3><ul>"
+            )
+
+            for e in week_events:
+                display_name = (
+                    e.name.replace(selected_course, "").strip(": ")
+                    if selected_course else e.name
+                )
+                style = (
+                    "color:#900; font-weight:bold;"
+                    if "due" in display_name.lower()
+                    else "color:#333;"
+                )
+                html_output.append(f"<li style='{style}'>{display_name}</li>")
+
+            html_output.append("</ul></div>")
+    else:
+        # In-person format
+        for e in events:
+            display_name = (
+                e.name.replace(selected_course, "").strip(": ")
+                if selected_course else e.name
+            )
+            html_output.append(
+                f"<div style='border-bottom:1px solid #eee; padding:10px;'>"
+                f"<strong>{e.begin.format('ddd, MMM D')}:</strong> {display_name}</div>"
+            )
+
+    html_output.append("</div>")
+    return "\n".join(html_output)
+
+
+def shift_preview(events, days, limit=5):
+    """Old and new dates for the first few events, as table rows"""
+    preview_data = []
+    for e in list(events)[:limit]:
+        old_date = e.begin.format('YYYY-MM-DD HH:mm')
+        new_date = (e.begin + timedelta(days=days)).format('YYYY-MM-DD HH:mm')
+        preview_data.append({
+            "Event": e.name[:50] + "..." if len(e.name) > 50 else e.name,
+            "Old Date": old_date,
+            "New Date": new_date
+        })
+    return preview_data
+
+
+def shift_calendar(calendar, days):
+    """New calendar with every event moved by the given number of days"""
+    new_calendar = ics.Calendar()
+    for e in calendar.events:
+        e.begin += timedelta(days=days)
+        e.end += timedelta(days=days)
+        new_calendar.events.add(e)
+    return new_calendar
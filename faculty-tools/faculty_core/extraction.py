@@ -0,0 +1,370 @@
+# extraction.py
+"""Page-level text extraction for the PDF tools (importable by worker processes)"""
+
+import multiprocessing
+import os
+import pickle
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from ._lazy import lazy_import
+from .text_elements import TextLine, TextSpan
+
+fitz = lazy_import('fitz')  # PyMuPDF
+
+# Below this many pages the process pool costs more than it saves
+PARALLEL_MIN_PAGES = 40
+# Pages handed to a worker at a time
+PAGES_PER_SHARD = 25
+
+# Per-worker document, opened once by the pool initializer
+_worker_doc = None
+
+
+def text_only_flags():
+    """get_text("dict") flags without TEXT_PRESERVE_IMAGES
+
+    Image blocks (and their raw image bytes) are never decoded or copied;
+    only text blocks come back.
+    """
+    return fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+
+def get_text_blocks(page, text_only=True):
+    """Text blocks of a page from get_text("dict")
+
+    text_only skips image payloads entirely, which matters for scanned or
+    image-heavy handouts; the text blocks are the same either way.
+    """
+    if text_only:
+        return page.get_text("dict", flags=text_only_flags())["blocks"]
+    return [block for block in page.get_text("dict")["blocks"] if block["type"] == 0]
+
+
+def append_span(spans, text, bold, italic):
+    """Append a run of text, extending the last span if it has the same formatting
+
+    PyMuPDF splits lines into many spans (font changes, kerning, small caps)
+    that often share bold/italic state; one span per formatting run keeps
+    span lists short and the HTML free of <em>a</em><em>b</em> runs.
+    """
+    if spans and spans[-1]['bold'] == bold and spans[-1]['italic'] == italic:
+        spans[-1]['text'] += text
+    else:
+        spans.append(TextSpan(text=text, bold=bold, italic=italic))
+
+
+def extend_spans(spans, more):
+    """Extend spans with more, merging the runs where they meet
+
+    Spans in more are never modified, so they can still belong to another
+    line; the last span of spans is replaced rather than changed in place.
+    """
+    if not more:
+        return
+    first = more[0]
+    if spans and spans[-1]['bold'] == first['bold'] and spans[-1]['italic'] == first['italic']:
+        spans[-1] = TextSpan(text=spans[-1]['text'] + first['text'], bold=first['bold'], italic=first['italic'])
+        spans.extend(more[1:])
+    else:
+        spans.extend(more)
+
+
+def extract_page_lines(page, page_num):
+    """Extract the text lines of one page with font metadata"""
+    lines = []
+    blocks = get_text_blocks(page)
+
+    for block in blocks:
+        if block["type"] == 0:  # Text block
+            for line in block["lines"]:
+                line_text = " ".join(span["text"] for span in line["spans"]).strip()
+
+                if line_text and len(line_text) > 1:
+                    max_font_size = max(span["size"] for span in line["spans"])
+                    fonts = [span["font"] for span in line["spans"]]
+                    is_bold = any("Bold" in font or "bold" in font for font in fonts)
+                    is_italic = any("Italic" in font or "Oblique" in font for font in fonts)
+                    y_position = line["bbox"][1]  # Top of line
+
+                    # Store span-level formatting for rich text output
+                    formatted_spans = []
+                    for span in line["spans"]:
+                        span_text = span["text"]
+                        if span_text.strip():
+                            span_bold = "Bold" in span["font"] or "bold" in span["font"]
+                            span_italic = "Italic" in span["font"] or "Oblique" in span["font"]
+                            append_span(formatted_spans, span_text, span_bold, span_italic)
+
+                    lines.append(TextLine(
+                        page=page_num,
+                        text=line_text,
+                        formatted_spans=formatted_spans,
+                        font_size=max_font_size,
+                        bold=is_bold,
+                        italic=is_italic,
+                        char_count=len(line_text),
+                        y_position=y_position,
+                        page_height=page.rect.height,
+                        suggested_tag=None,
+                        user_tag=None
+                    ))
+
+    return lines
+
+
+def iter_page_lines(pdf_bytes, page_indices=None):
+    """Yield (page_num, lines) one page at a time, keeping only one page in memory
+
+    page_indices (0-based) limits extraction to those pages, in that order.
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        if page_indices is None:
+            page_indices = range(doc.page_count)
+        for page_index in page_indices:
+            yield page_index + 1, extract_page_lines(doc[page_index], page_index + 1)
+    finally:
+        doc.close()
+
+
+def pdf_page_count(pdf_bytes):
+    """Number of pages, without extracting anything"""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    page_count = doc.page_count
+    doc.close()
+    return page_count
+
+
+def parse_page_range(text, page_count):
+    """Parse "45-78" or "12" into 1-based inclusive (first, last) page numbers
+
+    Blank text means the whole document and returns None. Raises ValueError
+    with a message suitable for showing to the user.
+    """
+    text = text.strip().replace('–', '-').replace(' ', '')
+    if not text:
+        return None
+    first_text, dash, last_text = text.partition('-')
+    try:
+        first = int(first_text) if first_text else 1
+        last = int(last_text) if last_text else (page_count if dash else first)
+    except ValueError:
+        raise ValueError(f'"{text}" is not a page range like 45-78') from None
+    if not 1 <= first <= last <= page_count:
+        raise ValueError(f"Pages must be between 1 and {page_count}, with the first page before the last")
+    return first, last
+
+
+def page_range_indices(page_range, page_count):
+    """0-based page indices for a (first, last) range, or every page for None"""
+    if page_range is None:
+        return range(page_count)
+    first, last = page_range
+    return range(max(first, 1) - 1, min(last, page_count))
+
+
+class LineSpool:
+    """Append-only, re-iterable sequence of lines (or other picklable items) in a temp file
+
+    Lets a streaming pipeline make several passes over a document's lines
+    without holding them all in memory. Lines are pickled in small chunks.
+    """
+
+    def __init__(self, chunk_size=256):
+        self._file = tempfile.TemporaryFile()
+        self._chunk = []
+        self._chunk_size = chunk_size
+        self.count = 0
+
+    def append(self, line):
+        self._chunk.append(line)
+        self.count += 1
+        if len(self._chunk) >= self._chunk_size:
+            self._flush()
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def _flush(self):
+        if self._chunk:
+            self._file.seek(0, os.SEEK_END)
+            pickle.dump(self._chunk, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._chunk = []
+
+    def __iter__(self):
+        self._flush()
+        end = self._file.seek(0, os.SEEK_END)
+        position = 0
+        while position < end:
+            self._file.seek(position)
+            chunk = pickle.load(self._file)
+            position = self._file.tell()
+            yield from chunk
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._file.close()
+
+
+# Structure element types that mark headings, and the level each maps to
+STRUCTURE_HEADING_TYPES = {'H': 1, 'H1': 1, 'H2': 2, 'H3': 3, 'H4': 4, 'H5': 5, 'H6': 6}
+# Stop walking pathological structure trees after this many nodes
+STRUCTURE_MAX_NODES = 100000
+OBJECT_REF = re.compile(r'(\d+) 0 R')
+
+
+def read_pdf_outline(pdf_bytes):
+    """Headings the PDF already declares, as (level, title, page) tuples
+
+    Uses the bookmark outline when there is one, otherwise heading elements
+    from the tagged structure tree. Returns [] when the PDF has neither.
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        outline = [(level, title.strip(), page)
+                   for level, title, page in doc.get_toc(simple=True)
+                   if page >= 1 and title.strip()]
+        if not outline:
+            outline = read_structure_headings(doc)
+        return outline
+    finally:
+        doc.close()
+
+
+def _pdf_string(doc, xref, key):
+    kind, value = doc.xref_get_key(xref, key)
+    if kind == 'string' and value.strip():
+        return value.strip()
+    return None
+
+
+def read_structure_headings(doc):
+    """(level, title, page) for heading elements in the StructTreeRoot
+
+    Only elements that carry their own text (/ActualText, /T or /Alt) can be
+    used; headings whose text lives solely in marked content are skipped.
+    """
+    if not doc.is_pdf:
+        return []
+    kind, value = doc.xref_get_key(doc.pdf_catalog(), "StructTreeRoot")
+    if kind != 'xref':
+        return []
+
+    page_numbers = {doc.page_xref(i): i + 1 for i in range(doc.page_count)}
+    headings = []
+    seen = set()
+    stack = [(int(value.split()[0]), None)]
+
+    # Depth-first in document order; children inherit the parent's /Pg
+    while stack and len(seen) < STRUCTURE_MAX_NODES:
+        xref, page = stack.pop()
+        if xref in seen or xref in page_numbers:
+            continue
+        seen.add(xref)
+
+        pg_kind, pg_value = doc.xref_get_key(xref, "Pg")
+        if pg_kind == 'xref':
+            page = page_numbers.get(int(pg_value.split()[0]), page)
+
+        s_kind, s_value = doc.xref_get_key(xref, "S")
+        level = STRUCTURE_HEADING_TYPES.get(s_value.lstrip('/')) if s_kind == 'name' else None
+        if level is not None and page is not None:
+            title = (_pdf_string(doc, xref, "ActualText") or _pdf_string(doc, xref, "T")
+                     or _pdf_string(doc, xref, "Alt"))
+            if title:
+                headings.append((level, title, page))
+
+        k_kind, k_value = doc.xref_get_key(xref, "K")
+        if k_kind in ('xref', 'array', 'dict'):
+            children = [int(ref) for ref in OBJECT_REF.findall(k_value)]
+            stack.extend((child, page) for child in reversed(children))
+
+    return headings
+
+
+def _init_worker(pdf_bytes):
+    """Open the shared document once per worker process"""
+    global _worker_doc
+    _worker_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+
+
+def _extract_shard(page_range):
+    """Extract lines for pages [start, stop) from the worker's document"""
+    start, stop = page_range
+    lines = []
+    for page_index in range(start, stop):
+        lines.extend(extract_page_lines(_worker_doc[page_index], page_index + 1))
+    return lines
+
+
+def _pool_context():
+    """Return a forkserver context where available, else spawn
+
+    Workers only need this module, which children import fresh. fork isn't
+    used: forking the threaded Streamlit server copies whatever locks its
+    other threads hold, and can deadlock in system frameworks on macOS.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def page_shards(page_count, shard_size=PAGES_PER_SHARD, first=0):
+    """Split pages [first, page_count) into consecutive (start, stop) ranges"""
+    return [(start, min(start + shard_size, page_count))
+            for start in range(first, page_count, shard_size)]
+
+
+def extract_raw_lines(pdf_bytes, parallel=False, max_workers=None, progress=None, page_indices=None):
+    """Extract all text lines in page order, optionally across a process pool
+
+    Parallel mode splits the document into page shards, extracts each shard in
+    a worker that opens its own copy of the document, and concatenates the
+    results in shard order, so the output is identical to the serial path.
+
+    page_indices, a range of 0-based page indices, limits extraction to those
+    pages. progress, if given, is called as progress(pages_done, new_lines)
+    after each page (or shard); an exception it raises stops the extraction.
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    if page_indices is None:
+        page_indices = range(doc.page_count)
+
+    if not parallel or len(page_indices) < PARALLEL_MIN_PAGES:
+        raw_lines = []
+        try:
+            for pages_done, page_index in enumerate(page_indices, 1):
+                page_lines = extract_page_lines(doc[page_index], page_index + 1)
+                raw_lines.extend(page_lines)
+                if progress:
+                    progress(pages_done, page_lines)
+        finally:
+            doc.close()
+        return raw_lines
+
+    doc.close()
+    shards = page_shards(page_indices.stop, first=page_indices.start)
+    if max_workers is None:
+        max_workers = min(len(shards), os.cpu_count() or 1)
+
+    raw_lines = []
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context(),
+                                   initializer=_init_worker, initargs=(pdf_bytes,))
+    try:
+        # map() yields results in submission order, which is page order
+        for (_, stop), shard_lines in zip(shards, executor.map(_extract_shard, shards)):
+            raw_lines.extend(shard_lines)
+            if progress:
+                progress(stop - page_indices.start, shard_lines)
+    except BaseException:
+        # Don't wait for the remaining shards when stopping early
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    return raw_lines
@@ -0,0 +1,198 @@
+# html_sections.py
+"""Per-section HTML fragments for incremental regeneration
+
+Both output formats reset their paragraph and list state at every heading,
+so a document renders as its sections rendered one after another: a heading
+and the body text up to the next heading, plus any body text before the
+first heading. SectionRenderer keeps each section's fragment keyed by its
+element range (first and last element_id) and heading tag, so after a tag
+change only the sections whose range or heading changed are rendered again.
+
+split_canvas_pages packs those fragments into Canvas page-sized parts at
+H1/H2 boundaries, and canvas_pages_zip bundles the parts with an index.
+
+Elements need element_ids (review.assign_element_ids), and their text and
+positions must not change while a renderer is in use; only tags may.
+"""
+
+import html
+import io
+import re
+import zipfile
+from itertools import chain
+
+from .pdf_html import HTML_EMITTERS, iter_body_html, write_lines
+
+
+def section_bounds(elements):
+    """(start, end) index ranges of the sections, in document order"""
+    bounds = []
+    start = 0
+    for position, elem in enumerate(elements):
+        if elem['user_tag'] != 'Body Text' and position > start:
+            bounds.append((start, position))
+            start = position
+    if elements:
+        bounds.append((start, len(elements)))
+    return bounds
+
+
+class SectionRenderer:
+    """Renders one output format, reusing fragments of unchanged sections"""
+
+    def __init__(self, html_format):
+        self.html_format = html_format
+        self.emitter = HTML_EMITTERS[html_format]
+        self._fragments = {}
+        # Sections rendered (not reused) by the last call, for progress/debug
+        self.last_rendered = 0
+        # Bumped whenever the set of sections changes, so output built from
+        # an earlier version (e.g. a prepared download) can be spotted as stale
+        self.version = 0
+
+    def sections(self, elements):
+        """(start, end, fragment) of every section, in order"""
+        fragments = {}
+        sections = []
+        self.last_rendered = 0
+        for start, end in section_bounds(elements):
+            key = (elements[start]['element_id'], elements[end - 1]['element_id'],
+                   elements[start]['user_tag'])
+            fragment = self._fragments.get(key)
+            if fragment is None:
+                fragment = self.emitter.line_separator.join(iter_body_html(elements[start:end], self.emitter))
+                self.last_rendered += 1
+            fragments[key] = fragment
+            sections.append((start, end, fragment))
+        if fragments.keys() != self._fragments.keys():
+            self.version += 1
+        # Only keep the current sections so edits don't grow the cache
+        self._fragments = fragments
+        return sections
+
+    def fragments(self, elements):
+        """Rendered fragment of every non-empty section, in order"""
+        return [fragment for _, _, fragment in self.sections(elements) if fragment]
+
+    def render(self, elements, title=None):
+        """The whole document, identical to generate_standalone_html/generate_canvas_html"""
+        return self.emitter.line_separator.join(self._lines(elements, title))
+
+    def write(self, elements, out, title=None):
+        """Write the whole document to a text stream; returns the characters written"""
+        return write_lines(self._lines(elements, title), out, self.emitter.line_separator)
+
+    def wrap(self, fragments, title=None):
+        """A document of just these fragments, e.g. a preview window"""
+        return self.emitter.line_separator.join(chain(self.emitter.head(title), fragments, self.emitter.tail()))
+
+    def _lines(self, elements, title):
+        return chain(self.emitter.head(title), self.fragments(elements), self.emitter.tail())
+
+
+# Canvas pages get slow to load and edit well before this
+DEFAULT_CANVAS_PAGE_BYTES = 100_000
+
+# Headings a split prefers to start a page at
+SPLIT_TAGS = ('H1', 'H2')
+
+
+def split_canvas_pages(elements, max_bytes=DEFAULT_CANVAS_PAGE_BYTES, renderer=None):
+    """Split Canvas output into page-sized parts at heading boundaries
+
+    Whole H1/H2 sections (with their H3 subsections) are packed into parts
+    of at most max_bytes of UTF-8. A section too big on its own is split at
+    its H3s, and a single heading's section over budget becomes its own
+    part. Returns dicts with title, html, bytes and the PDF page span.
+    """
+    renderer = renderer or SectionRenderer('canvas')
+    separator = renderer.emitter.line_separator
+    # Units start at each H1/H2; each unit is a list of (start, end, fragment, bytes)
+    units = []
+    for start, end, fragment in renderer.sections(elements):
+        if not fragment:
+            continue
+        section = (start, end, fragment, len(fragment.encode('utf-8')))
+        if not units or elements[start]['user_tag'] in SPLIT_TAGS:
+            units.append([])
+        units[-1].append(section)
+
+    parts = []
+    current = []
+    current_bytes = 0
+
+    def flush():
+        nonlocal current, current_bytes
+        if current:
+            parts.append(canvas_part(elements, current, separator))
+            current = []
+            current_bytes = 0
+
+    def add(sections, size):
+        nonlocal current_bytes
+        if current and current_bytes + len(separator) + size > max_bytes:
+            flush()
+        current.extend(sections)
+        current_bytes += size + (len(separator) if current_bytes else 0)
+
+    for unit in units:
+        unit_bytes = sum(section[3] for section in unit) + len(separator) * (len(unit) - 1)
+        if unit_bytes <= max_bytes:
+            add(unit, unit_bytes)
+        else:
+            flush()
+            for section in unit:
+                add([section], section[3])
+            flush()
+    flush()
+    return parts
+
+
+def canvas_part(elements, sections, separator='\n'):
+    """One split part from its (start, end, fragment, bytes) sections"""
+    first = elements[sections[0][0]]
+    last = elements[sections[-1][1] - 1]
+    part_html = separator.join(section[2] for section in sections)
+    return {
+        'title': first['text'] if first['user_tag'] != 'Body Text' else None,
+        'html': part_html,
+        'bytes': len(part_html.encode('utf-8')),
+        'pages': (first['page'], last['page']),
+    }
+
+
+def part_filename(number, title):
+    """Zip entry name: numbered for ordering, then a slug of the title"""
+    slug = re.sub(r'[^a-z0-9]+', '-', (title or '').lower()).strip('-')[:50]
+    return f"{number:02d}-{slug or 'part'}.html"
+
+
+def canvas_pages_zip(parts, document_title):
+    """Zip of the parts plus an index.html listing them in order"""
+    index_rows = []
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for number, part in enumerate(parts, start=1):
+            filename = part_filename(number, part['title'])
+            archive.writestr(filename, part['html'])
+            title = html.escape(part['title'] or f"Part {number}")
+            first_page, last_page = part['pages']
+            pages = f"p. {first_page}" if first_page == last_page else f"pp. {first_page}-{last_page}"
+            index_rows.append(f'    <li><a href="{filename}">{title}</a> ({pages}, {part["bytes"] / 1000:.0f} KB)</li>')
+        archive.writestr('index.html', '\n'.join([
+            '<!DOCTYPE html>',
+            '<html lang="en">',
+            '<head>',
+            '<meta charset="UTF-8">',
+            f'<title>{html.escape(document_title)}: Canvas pages</title>',
+            '</head>',
+            '<body>',
+            f'<h1>{html.escape(document_title)}</h1>',
+            '<p>Create one Canvas page per file, in this order, and paste the file\'s HTML into the HTML editor.</p>',
+            '<ol>',
+            *index_rows,
+            '</ol>',
+            '</body>',
+            '</html>',
+        ]))
+    return buffer.getvalue()
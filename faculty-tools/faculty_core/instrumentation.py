@@ -0,0 +1,140 @@
+# instrumentation.py
+"""Optional per-stage timing and memory records for the PDF pipelines
+
+A StageRecorder is passed into the analysis functions; each stage runs inside
+recorder.stage(name), which records wall time, the number of elements the
+stage produced (set by the caller) and, when memory tracing is on, the
+tracemalloc peak reached during the stage. Work done in extraction worker
+processes isn't visible to tracemalloc.
+
+tracemalloc is process-wide. Recorders share it through a reference count,
+so tracing stops only when the last active recorder closes, but the peaks
+are process-wide too: while two sessions record at once, each stage's peak
+includes the other session's allocations, and each stage start resets the
+peak for both. Treat peaks from overlapping runs as approximate.
+
+The pipelines default to NULL_RECORDER, which records nothing, so the
+instrumentation costs nothing unless it is switched on. Finished runs can be
+appended as JSON lines to METRICS_LOG for later analysis.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+METRICS_LOG = os.environ.get(
+    'FACULTY_TOOLS_METRICS_LOG',
+    os.path.join(os.path.expanduser('~'), '.cache', 'faculty-tools', 'metrics.jsonl')
+)
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+def _acquire_tracing():
+    """Start tracemalloc for one more recorder, unless something else already traces"""
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_users += 1
+
+
+def _release_tracing():
+    """Stop tracemalloc when the last recorder that started it is done"""
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+class StageRecorder:
+    """Collects one record per pipeline stage for a single run"""
+
+    def __init__(self, tool, label=None, trace_memory=True):
+        self.tool = tool
+        self.label = label
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block; the caller may set record['count']"""
+        if self.trace_memory:
+            if not self._tracing:
+                _acquire_tracing()
+                self._tracing = True
+            tracemalloc.reset_peak()
+        record = {'stage': name, 'count': None}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            if self.trace_memory and tracemalloc.is_tracing():
+                record['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+            self.stages.append(record)
+
+    def close(self):
+        """Release memory tracing; it stops once no other recorder needs it"""
+        if self._tracing:
+            _release_tracing()
+            self._tracing = False
+
+    def total_seconds(self):
+        return round(sum(record['seconds'] for record in self.stages), 4)
+
+    def as_dict(self):
+        return {
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'tool': self.tool,
+            'label': self.label,
+            'total_seconds': self.total_seconds(),
+            'stages': list(self.stages),
+        }
+
+    def append_to_log(self, path=METRICS_LOG):
+        """Append this run as one JSON line; failures to write are ignored"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.as_dict()) + '\n')
+        except OSError:
+            pass
+
+
+class NullRecorder:
+    """Recorder that records nothing; the default for every pipeline"""
+
+    @contextmanager
+    def stage(self, name):
+        yield {}
+
+    def close(self):
+        pass
+
+
+NULL_RECORDER = NullRecorder()
+
+
+def stage_recorder(tool, label, enabled):
+    """A recorder for one run when enabled (e.g. a debug toggle), otherwise NULL_RECORDER"""
+    return StageRecorder(tool, label) if enabled else NULL_RECORDER
+
+
+def finish_recording(recorder, runs):
+    """Close and log a finished run, and append it to runs (e.g. a debug panel's list)"""
+    if recorder is NULL_RECORDER:
+        return
+    recorder.close()
+    recorder.append_to_log()
+    runs.append(recorder.as_dict())
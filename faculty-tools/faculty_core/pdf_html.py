@@ -0,0 +1,1319 @@
+# pdf_html.py
+"""PDF to accessible HTML pipeline: extraction, heading detection and HTML export"""
+
+from collections import Counter
+from itertools import islice
+import hashlib
+import html
+import re
+
+from ._lazy import lazy_import
+from .extraction import (
+    LineSpool,
+    extend_spans,
+    extract_raw_lines,
+    iter_page_lines,
+    page_range_indices,
+    pdf_page_count,
+    read_pdf_outline,
+)
+from .instrumentation import NULL_RECORDER
+
+np = lazy_import('numpy')
+
+# Bump when analysis output changes so cached results are not reused
+PIPELINE_VERSION = 5
+
+
+def line_size_counts(lines):
+    """Character count per font size (rounded to 0.5pt) for estimating body size"""
+    size_counts = Counter()
+    for line in lines:
+        rounded = round(line['font_size'] * 2) / 2
+        size_counts[rounded] += line['char_count']
+    return size_counts
+
+
+def merge_consecutive_lines(lines, body_font_size=None):
+    """Merge consecutive lines that appear to be part of the same block (e.g., multi-line headings)"""
+    if not lines:
+        return lines
+
+    # If we don't know body size yet, estimate it as the most common size
+    if body_font_size is None:
+        body_font_size = estimate_body_size(lines)
+
+    return list(iter_merged_lines(lines, body_font_size))
+
+
+def estimate_body_size(lines):
+    """Most common font size by character count (12 for no lines)"""
+    size_counts = line_size_counts(lines)
+    return size_counts.most_common(1)[0][0] if size_counts else 12
+
+
+def iter_merged_lines(lines, body_font_size):
+    """Generator form of merge_consecutive_lines; only looks at neighbouring lines"""
+    current = None
+    # Lines are only copied once something is merged into them
+    current_is_copy = False
+
+    for line in lines:
+        if current is None:
+            current = line
+            continue
+
+        # Check if this line should merge with the previous one
+        same_page = line['page'] == current['page']
+
+        # Is this likely a heading? (larger than body text)
+        avg_size = (current['font_size'] + line['font_size']) / 2
+        is_heading_sized = min(current['font_size'], line['font_size']) > body_font_size + 0.5
+
+        # For font size comparison - very lenient for headings (small caps vary a lot)
+        if is_heading_sized:
+            similar_size = abs(line['font_size'] - current['font_size']) < 5.0  # 5pt tolerance for headings
+        else:
+            similar_size = abs(line['font_size'] - current['font_size']) < 2.0
+
+        # Check vertical proximity - be more generous for larger text (headings)
+        max_gap = avg_size * 3.0  # Allow up to 3x font size gap
+        y_gap = line['y_position'] - current['y_position']
+        close_vertically = 0 < y_gap < max_gap
+
+        # For headings, be more aggressive about merging
+        # For body text, require both lines to be short
+        if is_heading_sized:
+            # Headings: merge if same page and close vertically (very lenient on size)
+            should_merge = same_page and similar_size and close_vertically
+        else:
+            # Body text: only merge short lines with same formatting
+            both_short = current['char_count'] < 80 and line['char_count'] < 80
+            same_formatting = line['bold'] == current['bold']
+            should_merge = same_page and similar_size and close_vertically and both_short and same_formatting
+
+        if should_merge:
+            if not current_is_copy:
+                current = current.copy()
+                current_is_copy = True
+            # Merge: append text with space
+            current['text'] = current['text'] + ' ' + line['text']
+            current['char_count'] = len(current['text'])
+            # Keep the larger font size
+            current['font_size'] = max(current['font_size'], line['font_size'])
+            # Preserve bold if either line is bold
+            current['bold'] = current['bold'] or line['bold']
+        else:
+            # Don't merge, save current and start new
+            yield current
+            current = line
+            current_is_copy = False
+
+    # Don't forget the last one
+    if current:
+        yield current
+
+
+def merge_consecutive_headings(elements):
+    """Second pass: merge consecutive heading elements that should be together"""
+    if not elements:
+        return elements
+
+    return list(iter_merged_headings(elements))
+
+
+def iter_merged_headings(elements):
+    """Generator form of merge_consecutive_headings; only looks at neighbouring elements"""
+    current = None
+    # Elements are only copied once something is merged into them
+    current_is_copy = False
+
+    for elem in elements:
+        if current is None:
+            current = elem
+            continue
+
+        # Only consider merging if both are headings
+        current_is_heading = current['user_tag'] in ['H1', 'H2', 'H3']
+        elem_is_heading = elem['user_tag'] in ['H1', 'H2', 'H3']
+
+        if current_is_heading and elem_is_heading:
+            same_page = elem['page'] == current['page']
+            # Check if they're close in heading level (H1+H2 can merge, but not H1+H3)
+            level_diff = abs(int(current['user_tag'][1]) - int(elem['user_tag'][1]))
+            close_level = level_diff <= 1
+
+            if same_page and close_level:
+                if not current_is_copy:
+                    current = current.copy()
+                    current_is_copy = True
+                # Merge them
+                current['text'] = current['text'] + ' ' + elem['text']
+                current['char_count'] = len(current['text'])
+                current['font_size'] = max(current['font_size'], elem['font_size'])
+                # Keep the higher heading level (H1 > H2 > H3)
+                if int(elem['user_tag'][1]) < int(current['user_tag'][1]):
+                    current['user_tag'] = elem['user_tag']
+                    current['suggested_tag'] = elem['suggested_tag']
+                continue
+
+        # Don't merge
+        yield current
+        current = elem
+        current_is_copy = False
+
+    if current:
+        yield current
+
+
+def join_body_text_lines(elements):
+    """Join consecutive body text lines that are continuations into single elements"""
+    if not elements:
+        return elements
+
+    return list(iter_joined_body_text(elements))
+
+
+def iter_joined_body_text(elements):
+    """Generator form of join_body_text_lines; only looks at neighbouring elements"""
+    current_block = None
+    # Blocks are only copied once a line is joined onto them
+    current_is_copy = False
+
+    for elem in elements:
+        tag = elem.get('user_tag', '')
+
+        if tag != 'Body Text':
+            # Not body text - flush current block and add this element
+            if current_block:
+                yield current_block
+                current_block = None
+            yield elem
+            continue
+
+        # Body text - check if we should join with previous
+        if current_block is None:
+            current_block = elem
+            current_is_copy = False
+            continue
+
+        # Check if this line starts with a list marker (don't join across list items)
+        text = elem.get('text', '').strip()
+        is_list_start = (
+            text.startswith('•') or text.startswith('●') or
+            text.startswith('○') or text.startswith('◦') or
+            text.startswith('-') and len(text) > 1 and text[1] == ' ' or
+            (len(text) > 2 and text[0].isdigit() and text[1] in '.)')
+        )
+
+        if is_list_start:
+            # New list item - flush current block
+            if current_block:
+                yield current_block
+            current_block = elem
+            current_is_copy = False
+            continue
+
+        # Check if we should join this line to the current block
+        if should_join_lines(current_block, elem):
+            if not current_is_copy:
+                current_block = current_block.copy()
+                # Give the block its own span list so extending it leaves the source element alone
+                if 'formatted_spans' in current_block:
+                    current_block['formatted_spans'] = list(current_block['formatted_spans'])
+                current_is_copy = True
+            # Join the text
+            current_text = current_block.get('text', '')
+            new_text = elem.get('text', '')
+
+            # Handle hyphenated words
+            if current_text.endswith('-'):
+                current_block['text'] = current_text[:-1] + new_text
+            else:
+                current_block['text'] = current_text + ' ' + new_text
+
+            current_block['char_count'] = len(current_block['text'])
+
+            # Merge formatted spans if available
+            if 'formatted_spans' in current_block and 'formatted_spans' in elem:
+                extend_spans(current_block['formatted_spans'], elem.get('formatted_spans', []))
+            elif 'formatted_spans' in elem:
+                current_block['formatted_spans'] = list(elem['formatted_spans'])
+
+        else:
+            # Don't join - flush current block and start new one
+            yield current_block
+            current_block = elem
+            current_is_copy = False
+
+    # Don't forget the last block
+    if current_block:
+        yield current_block
+
+
+def detect_list_type(text):
+    """Detect if text starts with a list marker and return the type"""
+    stripped = text.strip()
+
+    # Bulleted list markers
+    if stripped.startswith('•') or stripped.startswith('●'):
+        return 'bullet', stripped[1:].strip()
+    if stripped.startswith('-') and len(stripped) > 1 and stripped[1] == ' ':
+        return 'bullet', stripped[2:].strip()
+
+    # Sub-list markers (hollow circles, arrows, etc.)
+    if stripped.startswith('○') or stripped.startswith('◦') or stripped.startswith('▪'):
+        return 'sub-bullet', stripped[1:].strip()
+    if stripped.startswith('o ') and len(stripped) > 2:
+        return 'sub-bullet', stripped[2:].strip()
+
+    # Numbered list (1., 2., etc.)
+    import re
+    numbered_match = re.match(r'^(\d+)[.)]\s+(.+)', stripped)
+    if numbered_match:
+        return 'numbered', numbered_match.group(2)
+
+    # Lettered list (a., b., etc.)
+    lettered_match = re.match(r'^([a-zA-Z])[.)]\s+(.+)', stripped)
+    if lettered_match:
+        return 'lettered', lettered_match.group(2)
+
+    return None, text
+
+
+def format_text_with_spans(formatted_spans):
+    """Convert formatted spans to HTML with proper tags"""
+    if not formatted_spans:
+        return ''
+
+    result = []
+    for span in formatted_spans:
+        text = html.escape(span['text'])
+        if span.get('bold') and span.get('italic'):
+            result.append(f'<strong><em>{text}</em></strong>')
+        elif span.get('bold'):
+            result.append(f'<strong>{text}</strong>')
+        elif span.get('italic'):
+            result.append(f'<em>{text}</em>')
+        else:
+            result.append(text)
+
+    return ''.join(result)
+
+
+def should_join_across_page_break(last_text, current_text):
+    """Simple check if text should be joined across a page break (for HTML generation)"""
+    if not last_text:
+        return False
+
+    last_text = last_text.strip()
+    if not last_text:
+        return False
+
+    # If the last line ends with sentence-ending punctuation, don't join
+    if last_text[-1] in '.!?:;':
+        return False
+
+    # Join if ends mid-sentence
+    return True
+
+
+def should_join_lines(last_elem, current_elem):
+    """Determine if two lines should be joined into the same paragraph/block"""
+    if not last_elem or not current_elem:
+        return False
+
+    last_text = last_elem.get('text', '').strip()
+    if not last_text:
+        return False
+
+    # Different pages - check more carefully
+    if last_elem['page'] != current_elem['page']:
+        # Only join across pages if last line clearly continues
+        if last_text[-1] in '.!?:;':
+            return False
+        # Join if ends with comma, or mid-sentence
+        return True
+
+    # Same page - check vertical distance
+    y_gap = current_elem['y_position'] - last_elem['y_position']
+    line_height = last_elem['font_size'] * 1.5
+
+    # If gap is too large, don't join (new paragraph)
+    if y_gap > line_height * 2:
+        return False
+
+    # If last line ends with sentence punctuation AND next line starts with capital
+    # it's probably a new sentence/paragraph
+    if last_text[-1] in '.!?':
+        current_text = current_elem.get('text', '').strip()
+        if current_text and current_text[0].isupper():
+            # Could be new paragraph OR continuation - check gap
+            if y_gap > line_height * 1.5:
+                return False
+
+    # If last line ends with hyphen, definitely join (word split)
+    if last_text[-1] == '-':
+        return True
+
+    # Generally join lines that are close together
+    return y_gap < line_height * 2
+
+
+DIGIT_RUNS = re.compile(r'\d+')
+
+# Height of the top and bottom bands where running headers/footers live
+HEADER_FOOTER_BAND = 72
+
+
+def normalize_text_for_comparison(text):
+    """Normalize text for comparing running headers (ignore numbers, case)"""
+    # Replace all digits with #
+    normalized = DIGIT_RUNS.sub('#', text.lower())
+    # Remove extra whitespace
+    normalized = ' '.join(normalized.split())
+    return normalized
+
+
+class RunningHeaderDetector:
+    """Single-pass detector for running headers, footers and repeated text
+
+    observe() is called once per line, in page order. Each line is normalized
+    once into a fingerprint (64-bit digests of its text and normalized text,
+    so the counts don't keep every distinct line alive), and the detector
+    counts the distinct pages each exact text appears on, and the distinct
+    pages each normalized pattern (catches "WRITING SPACES 4", "WRITING
+    SPACES 5", etc.) appears on in the top and bottom bands. Memory and time
+    stay linear in the number of lines.
+    """
+
+    def __init__(self):
+        # fingerprint -> [distinct pages, last page seen]
+        self.text_pages = {}
+        self.band_pages = {}
+        # Pages actually observed; a page range such as 45-47 is three pages
+        self.pages = set()
+
+    @staticmethod
+    def _digest(text):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+    @staticmethod
+    def _count_page(pages_by_key, key, page):
+        seen = pages_by_key.get(key)
+        if seen is None:
+            pages_by_key[key] = [1, page]
+        elif seen[1] != page:
+            seen[0] += 1
+            seen[1] = page
+
+    def observe(self, elem):
+        """Record one line; returns its fingerprint for is_running()"""
+        text = elem['text']
+        page = elem['page']
+        text_key = self._digest(text)
+        pattern_key = self._digest(normalize_text_for_comparison(text))
+
+        self._count_page(self.text_pages, text_key, page)
+
+        page_height = elem.get('page_height', 792)  # Default letter size
+        y_position = elem['y_position']
+        if y_position < HEADER_FOOTER_BAND or y_position > page_height - HEADER_FOOTER_BAND:
+            self._count_page(self.band_pages, pattern_key, page)
+
+        self.pages.add(page)
+
+        return text_key, pattern_key
+
+    def is_running(self, fingerprint):
+        """True for text repeated across pages or a header/footer band pattern"""
+        text_key, pattern_key = fingerprint
+        # Same text on several pages (at least 2, so one-page documents survive)
+        repeated_threshold = max(2, min(3, len(self.pages)))
+        if self.text_pages[text_key][0] >= repeated_threshold:
+            return True
+        # Same pattern with varying page numbers in the header/footer bands on 2+ pages
+        band = self.band_pages.get(pattern_key)
+        return band is not None and band[0] >= 2
+
+
+def is_page_noise(text):
+    """Standalone page numbers, "Page X" labels and very short fragments"""
+    stripped = text.strip('.-–— ·•')
+    # Pure digits
+    if stripped.isdigit() and len(stripped) < 5:
+        return True
+    # Roman numerals (common for front matter)
+    if stripped.lower() in ['i', 'ii', 'iii', 'iv', 'v', 'vi', 'vii', 'viii', 'ix', 'x',
+                             'xi', 'xii', 'xiii', 'xiv', 'xv', 'xvi', 'xvii', 'xviii', 'xix', 'xx']:
+        return True
+    # "Page X" or "X of Y" patterns
+    if text.lower().startswith('page ') and len(text) < 15:
+        return True
+    if ' of ' in text.lower() and len(text) < 15 and any(c.isdigit() for c in text):
+        return True
+    # Very short fragments (likely artifacts)
+    return len(text) < 3
+
+
+# Pages on each side of a page range whose lines are fed to the running
+# header detector, so a short range still sees its headers repeat
+HEADER_CONTEXT_PAGES = 3
+
+
+def context_page_indices(page_indices, page_count, per_side=HEADER_CONTEXT_PAGES):
+    """Up to per_side pages before and after a range of 0-based page indices"""
+    before = range(max(0, page_indices.start - per_side), page_indices.start)
+    after = range(page_indices.stop, min(page_count, page_indices.stop + per_side))
+    return list(before) + list(after)
+
+
+def observe_context_pages(pdf_bytes, context_indices, detector, body_font_size):
+    """Feed lines from pages outside the selected range to the detector only"""
+    for _, page_lines in iter_page_lines(pdf_bytes, context_indices):
+        for line in iter_merged_lines(page_lines, body_font_size):
+            detector.observe(line)
+
+
+def selected_pages(pdf_bytes, page_range):
+    """(page_indices, context_indices) for a page range, or (None, None) for all pages"""
+    if page_range is None:
+        return None, None
+    page_count = pdf_page_count(pdf_bytes)
+    page_indices = page_range_indices(page_range, page_count)
+    return page_indices, context_page_indices(page_indices, page_count)
+
+
+def outline_titles(outline):
+    """(page, normalized title) pairs for lines that must never be filtered out"""
+    return {(page, normalize_heading_text(title)) for _, title, page in outline or ()}
+
+
+def iter_filtered_lines(observed_lines, detector, keep_titles=frozenset()):
+    """Drop headers/footers and noise from (line, fingerprint) pairs
+
+    keep_titles (see outline_titles) protects outline headings that repeat
+    like running headers, e.g. "Chapter 1", "Chapter 2" at the top of a page.
+    """
+    for elem, fingerprint in observed_lines:
+        # Skip running headers/footers and text repeated across pages
+        if detector.is_running(fingerprint):
+            if (elem['page'], normalize_heading_text(elem['text'])) not in keep_titles:
+                continue
+
+        # Skip standalone page numbers and short fragments
+        if is_page_noise(elem['text']):
+            continue
+
+        yield elem
+
+
+def analyze_pdf_structure(pdf_bytes, parallel=False, outline=None, recorder=NULL_RECORDER,
+                          progress=None, page_range=None):
+    """Extract text from PDF with font metadata
+
+    With parallel=True, large documents are extracted in page shards across a
+    process pool; the result is identical to the serial path. Lines matching
+    an entry of the PDF's outline are kept even if they repeat across pages.
+    progress is passed through to extract_raw_lines.
+
+    page_range, a 1-based inclusive (first, last) pair, limits extraction to
+    those pages; a few neighbouring pages are read only to recognise running
+    headers and footers.
+    """
+    page_indices, context_indices = selected_pages(pdf_bytes, page_range)
+
+    # First pass: collect all lines
+    with recorder.stage('extraction') as record:
+        raw_lines = extract_raw_lines(pdf_bytes, parallel=parallel, progress=progress,
+                                      page_indices=page_indices)
+        record['count'] = len(raw_lines)
+
+    # Merge consecutive lines that are part of the same heading/block
+    with recorder.stage('line_merging') as record:
+        all_lines = merge_consecutive_lines(raw_lines)
+        record['count'] = len(all_lines)
+
+    # Filter out likely headers/footers and noise
+    with recorder.stage('header_footer_filtering') as record:
+        detector = RunningHeaderDetector()
+        if context_indices:
+            observe_context_pages(pdf_bytes, context_indices, detector, estimate_body_size(raw_lines))
+        observed_lines = [(elem, detector.observe(elem)) for elem in all_lines]
+        elements = list(iter_filtered_lines(observed_lines, detector, outline_titles(outline)))
+        record['count'] = len(elements)
+
+    return elements
+
+
+# Tag codes used by the vectorized heading detection
+HEADING_TAGS = ['H1', 'H2', 'H3', 'Body Text']
+BODY_TEXT_CODE = 3
+
+# Fields pulled out of each element for heading detection
+ELEMENT_ARRAY_DTYPE = [('font_size', 'f8'), ('char_count', 'f8'), ('bold', '?'), ('italic', '?')]
+
+# Elements tagged per vectorized batch when streaming
+TAGGING_BATCH_SIZE = 1024
+
+
+def element_arrays(elements):
+    """Columnar view of the fields heading detection needs, in one pass"""
+    return np.fromiter(
+        ((e['font_size'], e['char_count'], bool(e['bold']), bool(e['italic'])) for e in elements),
+        dtype=ELEMENT_ARRAY_DTYPE
+    )
+
+
+def heading_size_histogram(arrays):
+    """Character count per font size (rounded to nearest 1pt to avoid tiny variations)
+
+    Returns (sizes, weights, first_seen) arrays over the distinct rounded sizes.
+    """
+    rounded = np.round(arrays['font_size'])
+    sizes, first_seen, inverse = np.unique(rounded, return_index=True, return_inverse=True)
+    weights = np.bincount(inverse, weights=arrays['char_count'], minlength=len(sizes))
+    return sizes, weights, first_seen
+
+
+def heading_size_tiers(histogram):
+    """Cluster the sizes above body text into heading tiers
+
+    Returns (body_size, tier_floors): the smallest size in each tier, in
+    ascending order, limited to the tiers that become headings (H1 first).
+    """
+    sizes, weights, first_seen = histogram
+    if not len(sizes):
+        return 12, np.empty(0)
+
+    # Find body text size (most common by character count; ties go to the size seen first)
+    heaviest = np.flatnonzero(weights == weights.max())
+    body_size = sizes[heaviest[np.argmin(first_seen[heaviest])]]
+
+    # Get unique sizes significantly larger than body text (at least 2pt bigger)
+    larger_sizes = sizes[sizes > body_size + 1.5][::-1]
+
+    # Natural breaks, largest size first: a new tier starts where a size falls
+    # more than 4pt below the running average of the current tier. This keeps
+    # slight font size variations from creating extra heading levels. The scan
+    # is over distinct sizes only, so it stays a handful of steps.
+    tier_sums = []
+    tier_counts = []
+    tier_floors = []
+    for size in larger_sizes.tolist():
+        if tier_sums and tier_sums[-1] / tier_counts[-1] - size <= 4:
+            tier_sums[-1] += size
+            tier_counts[-1] += 1
+            tier_floors[-1] = size
+        else:
+            tier_sums.append(size)
+            tier_counts.append(1)
+            tier_floors.append(size)
+    tier_avgs = np.array(tier_sums) / np.array(tier_counts)
+
+    # For most documents, limit to 2 heading levels (H1 for title, H2 for sections)
+    # Only use H3 if there's a clear third tier with at least 3pt gap between each level
+    max_levels = 2
+    if len(tier_avgs) >= 3 and np.all(tier_avgs[:2] - tier_avgs[1:3] >= 3):
+        max_levels = 3
+
+    return body_size, np.array(tier_floors[:max_levels][::-1])
+
+
+def heading_tag_codes(arrays, tiers):
+    """Vectorized tag assignment; returns indexes into HEADING_TAGS"""
+    body_size, tier_floors = tiers
+    rounded = np.round(arrays['font_size'])
+    char_count = arrays['char_count']
+    bold = arrays['bold']
+    italic = arrays['italic']
+
+    # Tier lookup in one searchsorted pass: tier 0 (H1) has the highest floor
+    is_heading_size = rounded >= (tier_floors[0] if len(tier_floors) else np.inf)
+    tier = len(tier_floors) - np.searchsorted(tier_floors, rounded, side='right')
+
+    return np.select(
+        [
+            # Long text is always body (paragraphs)
+            char_count > 200,
+            # Italic-only short text is likely author byline, not a heading
+            italic & ~bold & (char_count < 50),
+            # Heading-sized text, but still require it to be reasonably short
+            is_heading_size & (char_count < 150),
+            is_heading_size,
+            # Short bold text at body size might be a subheading
+            bold & (char_count < 80),
+        ],
+        [BODY_TEXT_CODE, BODY_TEXT_CODE, tier, BODY_TEXT_CODE, 2],
+        default=BODY_TEXT_CODE
+    )
+
+
+def apply_heading_tags(elements, codes):
+    """Write tag codes back onto the elements"""
+    for elem, code in zip(elements, codes.tolist()):
+        elem['suggested_tag'] = HEADING_TAGS[code]
+        elem['user_tag'] = elem['suggested_tag']
+
+
+def iter_tagged_elements(elements, tiers):
+    """Generator form of the tagging step of detect_heading_hierarchy, in vectorized batches"""
+    elements = iter(elements)
+    while True:
+        batch = list(islice(elements, TAGGING_BATCH_SIZE))
+        if not batch:
+            return
+        apply_heading_tags(batch, heading_tag_codes(element_arrays(batch), tiers))
+        yield from batch
+
+
+def detect_heading_hierarchy(elements):
+    """Analyze font sizes to determine heading hierarchy"""
+    if not elements:
+        return elements
+
+    arrays = element_arrays(elements)
+    tiers = heading_size_tiers(heading_size_histogram(arrays))
+
+    # Assign tags to elements
+    apply_heading_tags(elements, heading_tag_codes(arrays, tiers))
+
+    return elements
+
+
+def get_headings_only(elements):
+    """Return only elements tagged as headings"""
+    return [e for e in elements if e['user_tag'] in ['H1', 'H2', 'H3']]
+
+
+def document_title(elements, fallback):
+    """Text of the first H1, or the fallback (usually the file name)"""
+    for elem in elements:
+        if elem['user_tag'] == 'H1':
+            return elem['text'][:100]
+    return fallback
+
+
+def get_body_text_sample(elements, max_items=5):
+    """Return a sample of body text elements for 'promote to heading' feature"""
+    body = [e for e in elements if e['user_tag'] == 'Body Text' and e['char_count'] < 100]
+    return body[:max_items]
+
+
+def normalize_heading_hierarchy(elements):
+    """Ensure heading levels don't skip - must go H1->H2->H3, never H1->H3
+
+    When a skip is detected, shift ALL remaining headings by the skip amount,
+    preserving their relative structure.
+    """
+    if not elements:
+        return elements
+
+    return list(iter_normalized_headings(elements))
+
+
+def iter_normalized_headings(elements):
+    """Generator form of normalize_heading_hierarchy; the shift is carried forward as it goes"""
+    shift_amount = 0
+    prev_level = 0
+    first_heading = True
+
+    for elem in elements:
+        tag = elem.get('user_tag', '')
+        if tag and tag.startswith('H') and tag[1:].isdigit():
+            # Apply current shift
+            adjusted_level = int(tag[1:]) - shift_amount
+
+            # Check if this creates a skip
+            if prev_level > 0 and adjusted_level > prev_level + 1:
+                # Skip detected! Calculate additional shift needed
+                additional_shift = adjusted_level - (prev_level + 1)
+                shift_amount += additional_shift
+                adjusted_level = prev_level + 1
+
+            # Update for next heading
+            prev_level = adjusted_level
+
+            # Don't let non-first headings become H1
+            new_level = adjusted_level
+            if not first_heading and new_level < 2:
+                new_level = 2
+            elem['user_tag'] = f'H{new_level}'
+            elem['suggested_tag'] = f'H{new_level}'
+            first_heading = False
+
+        yield elem
+
+
+# Share of outline entries that must match extracted lines before the outline is trusted
+OUTLINE_MIN_COVERAGE = 0.5
+# A partial match must cover at least this much of the longer text
+OUTLINE_MIN_OVERLAP = 0.6
+
+
+def normalize_heading_text(text):
+    """Lowercase words only, for matching outline titles to extracted lines"""
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def iter_outline_matches(elements, outline):
+    """Yield (elem, level) for each element, level None unless it matches an outline entry
+
+    An entry matches an element on the same page whose text equals the title
+    or, for titles split over lines, mostly overlaps it. Each entry is used once.
+    """
+    entries_by_page = {}
+    for index, (level, title, page) in enumerate(outline):
+        entries_by_page.setdefault(page, []).append((index, level, normalize_heading_text(title)))
+    used = set()
+
+    for elem in elements:
+        match_level = None
+        entries = entries_by_page.get(elem['page'])
+        if entries:
+            text = normalize_heading_text(elem['text'])
+            for index, level, title in entries:
+                if index in used or not text:
+                    continue
+                shorter, longer = sorted((text, title), key=len)
+                if text == title or (shorter in longer and len(shorter) >= OUTLINE_MIN_OVERLAP * len(longer)):
+                    used.add(index)
+                    match_level = level
+                    break
+        yield elem, match_level
+
+
+def outline_in_range(outline, page_range):
+    """Outline entries that start inside a (first, last) page range"""
+    if page_range is None:
+        return outline
+    first, last = page_range
+    return [entry for entry in outline if first <= entry[2] <= last]
+
+
+def outline_sections(outline, page_count, max_level=2):
+    """(level, title, first_page, last_page) for each entry down to max_level
+
+    A section ends on the page before the next entry at the same or a higher
+    level starts (or on that page, when both start on the same page).
+    """
+    entries = [entry for entry in outline if entry[0] <= max_level]
+    sections = []
+    for index, (level, title, page) in enumerate(entries):
+        last_page = page_count
+        for next_level, _, next_page in entries[index + 1:]:
+            if next_level <= level:
+                last_page = max(page, next_page - 1)
+                break
+        sections.append((level, title, page, last_page))
+    return sections
+
+
+def outline_covers(elements, outline):
+    """True when enough outline entries match extracted lines to trust the outline"""
+    if not outline:
+        return False
+    matched = sum(1 for _, level in iter_outline_matches(elements, outline) if level is not None)
+    return matched >= max(1, OUTLINE_MIN_COVERAGE * len(outline))
+
+
+def iter_outline_tagged(elements, outline):
+    """Tag elements straight from the PDF outline instead of font-size heuristics
+
+    Outline levels map to H1-H3 (deeper levels become H3). A level never
+    jumps more than one below the previous heading, in case an intermediate
+    entry didn't match.
+    """
+    prev_level = 0
+    for elem, level in iter_outline_matches(elements, outline):
+        if level is None:
+            tag = 'Body Text'
+        else:
+            level = min(level, 3, prev_level + 1)
+            prev_level = level
+            tag = f'H{level}'
+        elem['suggested_tag'] = tag
+        elem['user_tag'] = tag
+        yield elem
+
+
+def analyze_pdf_document(pdf_bytes, low_memory=False, parallel=True, recorder=NULL_RECORDER,
+                         progress=None, page_range=None):
+    """Extract elements and assign heading levels for the review step
+
+    PDFs that carry a bookmark outline (or a tagged structure tree) get their
+    headings from it; others go through the font-size heuristics. low_memory
+    runs the analysis page by page with intermediate lines spooled to disk,
+    which keeps the analysis passes flat, but the returned list still holds
+    every element (the review step needs them all). To write output without
+    the list, use spool_pdf_document. Callers that already run one document
+    per process pass parallel=False to keep extraction in-process.
+    progress(pages_done, new_lines) is called as pages are extracted.
+    page_range (first, last) analyses only those pages.
+    """
+    with recorder.stage('outline') as record:
+        outline = outline_in_range(read_pdf_outline(pdf_bytes), page_range)
+        record['count'] = len(outline)
+
+    if low_memory:
+        # Same passes as below, streamed page by page
+        with recorder.stage('streamed_analysis') as record:
+            elements = list(stream_pdf_elements(pdf_bytes, outline, progress=progress,
+                                                page_range=page_range))
+            record['count'] = len(elements)
+        return elements
+
+    elements = analyze_pdf_structure(pdf_bytes, parallel=parallel, outline=outline, recorder=recorder,
+                                     progress=progress, page_range=page_range)
+
+    # Fast path: the document already says what its headings are
+    if outline_covers(elements, outline):
+        with recorder.stage('outline_tagging') as record:
+            elements = list(iter_outline_tagged(elements, outline))
+            record['count'] = len(elements)
+        return elements
+
+    with recorder.stage('hierarchy_detection') as record:
+        elements = detect_heading_hierarchy(elements)
+        record['count'] = len(elements)
+    # Second pass: merge consecutive headings that got split
+    with recorder.stage('heading_merging') as record:
+        elements = merge_consecutive_headings(elements)
+        record['count'] = len(elements)
+    # Re-detect hierarchy after merging (font size tiers may have changed)
+    with recorder.stage('hierarchy_redetection') as record:
+        elements = detect_heading_hierarchy(elements)
+        record['count'] = len(elements)
+    # Final pass: ensure no heading levels are skipped (accessibility)
+    with recorder.stage('normalization') as record:
+        elements = normalize_heading_hierarchy(elements)
+        record['count'] = len(elements)
+    return elements
+
+
+def spool_pdf_document(pdf_bytes, recorder=NULL_RECORDER, progress=None, page_range=None):
+    """The low-memory analysis with its elements spooled to a temp file
+
+    Returns a LineSpool of the same elements analyze_pdf_document returns.
+    It can be iterated any number of times (for the title, counts, then the
+    HTML itself) without holding the document in memory.
+    """
+    with recorder.stage('outline') as record:
+        outline = outline_in_range(read_pdf_outline(pdf_bytes), page_range)
+        record['count'] = len(outline)
+    elements = LineSpool()
+    with recorder.stage('streamed_analysis') as record:
+        elements.extend(stream_pdf_elements(pdf_bytes, outline, progress=progress, page_range=page_range))
+        record['count'] = len(elements)
+    return elements
+
+
+def stream_pdf_elements(pdf_bytes, outline=None, progress=None, page_range=None):
+    """Yield analysed elements without holding the whole document in memory
+
+    Produces the same elements as analyze_pdf_document. Extraction runs one
+    page at a time; the document-wide decisions (body size, repeated
+    headers/footers, outline coverage, heading size tiers) come from small
+    summaries gathered in earlier passes, with the lines between passes
+    spooled to a temp file.
+    """
+    page_indices, context_indices = selected_pages(pdf_bytes, page_range)
+    raw_lines = LineSpool()
+    merged_lines = LineSpool()
+    filtered_lines = LineSpool()
+    try:
+        size_counts = Counter()
+        for pages_done, (_, page_lines) in enumerate(iter_page_lines(pdf_bytes, page_indices), 1):
+            size_counts.update(line_size_counts(page_lines))
+            raw_lines.extend(page_lines)
+            if progress:
+                progress(pages_done, page_lines)
+
+        if not raw_lines:
+            return
+
+        body_font_size = size_counts.most_common(1)[0][0]
+        detector = RunningHeaderDetector()
+        if context_indices:
+            observe_context_pages(pdf_bytes, context_indices, detector, body_font_size)
+        for line in iter_merged_lines(raw_lines, body_font_size):
+            merged_lines.append((line, detector.observe(line)))
+
+        filtered_lines.extend(iter_filtered_lines(merged_lines, detector, outline_titles(outline)))
+        if not filtered_lines:
+            return
+
+        if outline_covers(filtered_lines, outline):
+            yield from iter_outline_tagged(filtered_lines, outline)
+            return
+
+        first_tiers = heading_size_tiers(heading_size_histogram(element_arrays(filtered_lines)))
+        second_tiers = heading_size_tiers(heading_size_histogram(element_arrays(
+            iter_merged_headings(iter_tagged_elements(filtered_lines, first_tiers))
+        )))
+
+        yield from iter_normalized_headings(iter_tagged_elements(
+            iter_merged_headings(iter_tagged_elements(filtered_lines, first_tiers)),
+            second_tiers
+        ))
+    finally:
+        raw_lines.close()
+        merged_lines.close()
+        filtered_lines.close()
+
+
+def generate_standalone_html(elements, title, compact=False):
+    """Generate a complete HTML document with embedded CSS"""
+    emitter = HTML_EMITTERS['standalone-compact' if compact else 'standalone']
+    return emitter.line_separator.join(iter_html_lines(elements, emitter, title))
+
+
+def generate_canvas_html(elements, compact=False):
+    """Generate Canvas-compatible HTML (headers start at H2)"""
+    emitter = HTML_EMITTERS['canvas-compact' if compact else 'canvas']
+    return emitter.line_separator.join(iter_html_lines(elements, emitter))
+
+
+def write_html(elements, out, emitter, title=None):
+    """Write the document to a text stream (file, StringIO, ...) line by line
+
+    The full output is never built in memory. Returns the characters written.
+    """
+    return write_lines(iter_html_lines(elements, emitter, title), out, emitter.line_separator)
+
+
+def write_lines(lines, out, line_separator='\n'):
+    """Write lines with line_separator between them; returns the characters written"""
+    written = 0
+    separator = ''
+    for line in lines:
+        out.write(separator)
+        out.write(line)
+        written += len(separator) + len(line)
+        separator = line_separator
+    return written
+
+
+def iter_html_lines(elements, emitter, title=None):
+    """Output lines of a whole document in emitter's format"""
+    yield from emitter.head(title)
+    yield from iter_body_html(elements, emitter)
+    yield from emitter.tail()
+
+
+def iter_body_html(elements, emitter):
+    """The rendering engine shared by every format; yields output lines
+
+    Tracks paragraphs, lists and page breaks and hands finished blocks to
+    emitter. All state resets at each heading.
+    """
+    # First, join consecutive body text lines that are continuations
+    elements = iter_joined_body_text(elements)
+
+    # Process body text with formatting, lists, and proper paragraph breaks
+    current_paragraph = []
+    current_list = []
+    current_list_type = None
+    last_body_elem = None
+
+    def flush_paragraph():
+        nonlocal current_paragraph
+        if not current_paragraph:
+            return []
+        lines = emitter.paragraph(" ".join(current_paragraph))
+        current_paragraph = []
+        return lines
+
+    def flush_list():
+        nonlocal current_list, current_list_type
+        if not current_list:
+            return []
+        lines = emitter.list(current_list_type, current_list)
+        current_list = []
+        current_list_type = None
+        return lines
+
+    for elem in elements:
+        tag = elem['user_tag']
+
+        # Get formatted text (with italics/bold)
+        if elem.get('formatted_spans'):
+            formatted_text = format_text_with_spans(elem['formatted_spans'])
+        else:
+            formatted_text = html.escape(elem['text'])
+
+        if tag == 'Body Text':
+            # Check for list markers
+            list_type, list_content = detect_list_type(elem['text'])
+
+            if list_type:
+                # Flush any pending paragraph first
+                yield from flush_paragraph()
+
+                # Get formatted version of the list content
+                if elem.get('formatted_spans'):
+                    # Re-format without the list marker
+                    formatted_list_content = format_text_with_spans(elem['formatted_spans'])
+                    # Try to strip the marker from the formatted content
+                    for marker in ['•', '●', '○', '◦', '▪', '-', 'o ']:
+                        if formatted_list_content.startswith(marker):
+                            formatted_list_content = formatted_list_content[len(marker):].strip()
+                            break
+                    # Also check for numbered/lettered patterns
+                    formatted_list_content = re.sub(r'^(\d+|[a-zA-Z])[.)]\s*', '', formatted_list_content)
+                else:
+                    formatted_list_content = html.escape(list_content)
+
+                # If switching list types, flush the old list
+                if current_list_type and current_list_type != list_type:
+                    yield from flush_list()
+
+                current_list.append(formatted_list_content)
+                current_list_type = list_type
+                last_body_elem = elem
+                continue
+
+            # Not a list item - flush any pending list
+            yield from flush_list()
+
+            # Check if this is a new paragraph
+            if last_body_elem is not None and current_paragraph:
+                is_new_page = elem['page'] != last_body_elem['page']
+                y_gap = elem['y_position'] - last_body_elem['y_position']
+                line_height = last_body_elem['font_size'] * 1.5
+
+                if is_new_page:
+                    # Check if we should join across page break
+                    last_text = last_body_elem.get('text', '')
+                    if not should_join_across_page_break(last_text, elem['text']):
+                        yield from flush_paragraph()
+                elif y_gap > line_height * 2:
+                    # Large gap within same page = new paragraph
+                    yield from flush_paragraph()
+
+            current_paragraph.append(formatted_text)
+            last_body_elem = elem
+        else:
+            # Heading - flush any pending content
+            yield from flush_paragraph()
+            yield from flush_list()
+            last_body_elem = None
+
+            yield from emitter.heading(tag, formatted_text)
+
+    # Flush any remaining content
+    yield from flush_paragraph()
+    yield from flush_list()
+
+
+class HtmlEmitter:
+    """Turns the engine's blocks into the lines of one output format
+
+    Each method returns a list of lines. Subclass to add a format; the
+    defaults write unindented <h1>-<h3>, <p>, <ul> and <ol>.
+    """
+
+    block_indent = ''
+    item_indent = '    '
+    # Written between lines by generate_*/write_html
+    line_separator = '\n'
+    heading_tags = {'H1': 'h1', 'H2': 'h2', 'H3': 'h3'}
+    # Used for heading tags missing from heading_tags; None drops the element
+    fallback_heading_tag = None
+
+    def head(self, title):
+        return []
+
+    def tail(self):
+        return []
+
+    def inline(self, text):
+        """Hook for the formatted text of every block"""
+        return text
+
+    def heading(self, tag, text):
+        html_tag = self.heading_tags.get(tag, self.fallback_heading_tag)
+        if html_tag is None:
+            return []
+        return [f'{self.block_indent}<{html_tag}>{self.inline(text)}</{html_tag}>']
+
+    def paragraph(self, text):
+        return [f'{self.block_indent}<p>{self.inline(text)}</p>']
+
+    def list(self, list_type, items):
+        tag = 'ol' if list_type in ('numbered', 'lettered') else 'ul'
+        return [
+            f'{self.block_indent}<{tag}>',
+            *(f'{self.item_indent}<li>{self.inline(item)}</li>' for item in items),
+            f'{self.block_indent}</{tag}>',
+        ]
+
+
+class StandaloneEmitter(HtmlEmitter):
+    """Complete HTML document with embedded CSS"""
+
+    block_indent = '        '
+    item_indent = '            '
+
+    def head(self, title):
+        return standalone_head_parts(title)
+
+    def tail(self):
+        return STANDALONE_TAIL_PARTS
+
+
+class CanvasEmitter(HtmlEmitter):
+    """Fragment for the Canvas editor: headings shifted down one level"""
+
+    heading_tags = {'H1': 'h2', 'H2': 'h3', 'H3': 'h4'}
+    fallback_heading_tag = 'p'
+
+
+WHITESPACE_RUN = re.compile(r'\s+')
+# Whitespace around an empty inline tag pair, e.g. "a </em><em> b"
+EMPTY_RUN_GAP = re.compile(r'</(em|strong)>(\s*)<\1>')
+
+
+class CompactMixin:
+    """No indentation or newlines, and runs of whitespace collapsed
+
+    Browsers render the result identically; it is mainly smaller Canvas
+    pages and session state.
+    """
+
+    block_indent = ''
+    item_indent = ''
+    line_separator = ''
+
+    def inline(self, text):
+        text = EMPTY_RUN_GAP.sub(r'\2', text)
+        return WHITESPACE_RUN.sub(' ', text).strip()
+
+
+class CompactStandaloneEmitter(CompactMixin, StandaloneEmitter):
+    """Standalone document with the CSS and markup whitespace removed"""
+
+    def head(self, title):
+        return [WHITESPACE_RUN.sub(' ', part).strip() for part in standalone_head_parts(title)]
+
+    def tail(self):
+        return [part.strip() for part in STANDALONE_TAIL_PARTS]
+
+
+class CompactCanvasEmitter(CompactMixin, CanvasEmitter):
+    """Canvas fragment with markup whitespace removed"""
+
+
+# Closes what standalone_head_parts opens
+STANDALONE_TAIL_PARTS = [
+    '    </main>',
+    '</body>',
+    '</html>'
+]
+
+
+def standalone_head_parts(title):
+    """Lines of the standalone document up to and including <main>"""
+    css = """
+        * {
+            box-sizing: border-box;
+        }
+        body {
+            font-family: Georgia, 'Times New Roman', serif;
+            line-height: 1.7;
+            color: #1a1a1a;
+            background-color: #ffffff;
+            margin: 0;
+            padding: 2rem;
+        }
+        main {
+            max-width: 45rem;
+            margin: 0 auto;
+        }
+        h1 {
+            font-size: 2rem;
+            font-weight: 700;
+            color: #0f172a;
+            margin: 2rem 0 1rem 0;
+            line-height: 1.3;
+        }
+        h2 {
+            font-size: 1.5rem;
+            font-weight: 600;
+            color: #1e293b;
+            margin: 1.75rem 0 0.75rem 0;
+            line-height: 1.4;
+        }
+        h3 {
+            font-size: 1.25rem;
+            font-weight: 600;
+            color: #334155;
+            margin: 1.5rem 0 0.5rem 0;
+            line-height: 1.4;
+        }
+        p {
+            margin: 0 0 1rem 0;
+        }
+        ul, ol {
+            margin: 0 0 1rem 0;
+            padding-left: 2rem;
+        }
+        li {
+            margin: 0.25rem 0;
+        }
+        em {
+            font-style: italic;
+        }
+        strong {
+            font-weight: 700;
+        }
+        /* First heading should have no top margin */
+        main > h1:first-child,
+        main > h2:first-child,
+        main > h3:first-child {
+            margin-top: 0;
+        }
+        /* Accessibility: focus styles */
+        a:focus {
+            outline: 2px solid #3b82f6;
+            outline-offset: 2px;
+        }
+        /* Responsive adjustments */
+        @media (max-width: 600px) {
+            body {
+                padding: 1rem;
+            }
+            h1 {
+                font-size: 1.75rem;
+            }
+            h2 {
+                font-size: 1.35rem;
+            }
+            h3 {
+                font-size: 1.15rem;
+            }
+        }
+    """
+
+    return [
+        '<!DOCTYPE html>',
+        '<html lang="en">',
+        '<head>',
+        '    <meta charset="UTF-8">',
+        '    <meta name="viewport" content="width=device-width, initial-scale=1.0">',
+        f'    <title>{html.escape(title)}</title>',
+        '    <style>',
+        css,
+        '    </style>',
+        '</head>',
+        '<body>',
+        '    <main>'
+    ]
+
+
+HTML_EMITTERS = {
+    'standalone': StandaloneEmitter(),
+    'canvas': CanvasEmitter(),
+    'standalone-compact': CompactStandaloneEmitter(),
+    'canvas-compact': CompactCanvasEmitter(),
+}
@@ -0,0 +1,251 @@
+# pdf_merge.py
+"""Page extraction, merging, table of contents and page numbering for the PDF editor"""
+
+import hashlib
+from io import BytesIO
+
+from ._lazy import lazy_import
+
+fitz = lazy_import('fitz')  # PyMuPDF, for the pymupdf merge backend
+pypdf = lazy_import('pypdf')
+canvas = lazy_import('reportlab.pdfgen.canvas')
+pagesizes = lazy_import('reportlab.lib.pagesizes')
+
+MERGE_BACKENDS = ('pypdf', 'pymupdf')
+
+
+class PdfSource:
+    """One uploaded PDF, parsed once and shared by every reference to its pages"""
+
+    def __init__(self, pdf_bytes, name=None):
+        self.pdf_bytes = pdf_bytes
+        self.name = name
+        self.source_id = hashlib.sha256(pdf_bytes).hexdigest()[:16]
+        self._reader = None
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = pypdf.PdfReader(BytesIO(self.pdf_bytes))
+        return self._reader
+
+    @property
+    def page_count(self):
+        return len(self.reader.pages)
+
+
+def page_ref(source_id, page_index, rotation=0):
+    """A page of a source by reference: which page, plus how to transform it"""
+    return {
+        'source_id': source_id,
+        'page_index': page_index,
+        'page_num': page_index + 1,
+        'rotation': rotation,
+    }
+
+
+def extract_pages_from_pdf(source):
+    """A page reference for every page of a PdfSource
+
+    Thumbnails are rendered separately, on demand (see thumbnails.py).
+    """
+    return [page_ref(source.source_id, i) for i in range(source.page_count)]
+
+def move_pages(pages, start, stop, new_start):
+    """Move pages[start:stop] in place so the block starts at position new_start"""
+    block = pages[start:stop]
+    del pages[start:stop]
+    new_start = min(max(new_start, 0), len(pages))
+    pages[new_start:new_start] = block
+    return new_start
+
+def add_referenced_pages(writer, pages, sources):
+    """Append referenced pages to a PdfWriter, applying their rotation
+
+    Pages of one source come from its single parsed reader, so the writer
+    copies shared fonts and images once rather than once per page.
+    """
+    for ref in pages:
+        page = writer.add_page(sources[ref['source_id']].reader.pages[ref['page_index']])
+        if ref['rotation']:
+            page.rotate(ref['rotation'])
+
+def page_number_point(position, page_width, page_height):
+    """Centre of the page number's baseline, in PDF coordinates (origin bottom-left)"""
+    positions = {
+        'bottom-center': (page_width / 2, 30),
+        'bottom-right': (page_width - 50, 30),
+        'bottom-left': (50, 30),
+        'top-center': (page_width / 2, page_height - 30),
+        'top-right': (page_width - 50, page_height - 30),
+        'top-left': (50, page_height - 30),
+    }
+    return positions.get(position, (page_width / 2, 30))
+
+def number_pages(pages, position='bottom-center', start_num=1):
+    """Stamp page numbers onto pypdf pages in place
+
+    Every page's number is drawn into one overlay document, each overlay
+    page sized to cover the page it goes on. The overlay is parsed once and
+    merged page by page. Numbers are placed within the cropbox, the part of
+    the page a viewer shows.
+    """
+    packet = BytesIO()
+    can = canvas.Canvas(packet)
+    for page_num, page in enumerate(pages):
+        crop = page.cropbox
+        x, y = page_number_point(position, float(crop.width), float(crop.height))
+        
+        # Overlay space starts at the page's origin, so cover up to the far corner
+        can.setPageSize((max(float(page.mediabox.right), float(crop.right)),
+                         max(float(page.mediabox.top), float(crop.top))))
+        can.setFont("Helvetica", 10)
+        can.drawCentredString(float(crop.left) + x, float(crop.bottom) + y, str(page_num + start_num))
+        can.showPage()
+    can.save()
+    
+    packet.seek(0)
+    overlay = pypdf.PdfReader(packet)
+    for page, overlay_page in zip(pages, overlay.pages):
+        page.merge_page(overlay_page)
+
+def add_page_numbers(input_pdf_bytes, position='bottom-center', start_num=1):
+    """Add page numbers to PDF"""
+    writer = pypdf.PdfWriter(clone_from=BytesIO(input_pdf_bytes))
+    number_pages(list(writer.pages), position, start_num)
+    
+    output = BytesIO()
+    writer.write(output)
+    output.seek(0)
+    return output.read()
+
+def create_toc_page(toc_entries):
+    """Create a table of contents page"""
+    packet = BytesIO()
+    can = canvas.Canvas(packet, pagesize=pagesizes.letter)
+    
+    can.setFont("Helvetica-Bold", 20)
+    can.drawString(50, 750, "Table of Contents")
+    
+    can.setFont("Helvetica", 12)
+    y_position = 700
+    
+    for entry in toc_entries:
+        if y_position < 50:
+            can.showPage()
+            y_position = 750
+        can.drawString(70, y_position, f"{entry['title']}")
+        can.drawRightString(550, y_position, f"Page {entry['page']}")
+        y_position -= 25
+    
+    can.save()
+    packet.seek(0)
+    return packet.read()
+
+def merge_pdfs(pdf_list, sources, add_toc=True, page_num_position='bottom-center', start_num=1,
+               backend='pypdf'):
+    """Merge multiple PDFs with optional TOC and page numbers
+
+    pdf_list entries have a toc_title and a list of page references into
+    sources (source_id -> PdfSource). backend is one of MERGE_BACKENDS.
+    """
+    if backend == 'pymupdf':
+        return merge_pdfs_pymupdf(pdf_list, sources, add_toc, page_num_position, start_num)
+    writer = pypdf.PdfWriter()
+    
+    if add_toc:
+        toc_pdf_bytes = create_toc_page(toc_entries_for(pdf_list, add_toc))
+        toc_reader = pypdf.PdfReader(BytesIO(toc_pdf_bytes))
+        for page in toc_reader.pages:
+            writer.add_page(page)
+    
+    # Add pages in order they appear in each file's pages list
+    for pdf_info in pdf_list:
+        add_referenced_pages(writer, pdf_info['pages'], sources)
+    
+    if page_num_position != 'none':
+        number_pages(list(writer.pages), page_num_position, start_num)
+    
+    output = BytesIO()
+    writer.write(output)
+    output.seek(0)
+    return output.read()
+
+def toc_entries_for(pdf_list, add_toc):
+    """TOC entries (title, first page) for each file of the merged document"""
+    toc_entries = []
+    current_page = 2 if add_toc else 1
+    for pdf_info in pdf_list:
+        toc_entries.append({
+            'title': pdf_info['toc_title'],
+            'page': current_page
+        })
+        current_page += len(pdf_info['pages'])
+    return toc_entries
+
+def page_runs(pages):
+    """Split page references into runs of consecutive pages of one source
+
+    Each run is (source_id, first index, last index, rotation), so a run can
+    be copied with a single insert_pdf call.
+    """
+    runs = []
+    for ref in pages:
+        if runs:
+            source_id, first, last, rotation = runs[-1]
+            if (ref['source_id'] == source_id and ref['page_index'] == last + 1
+                    and ref['rotation'] == rotation):
+                runs[-1] = (source_id, first, last + 1, rotation)
+                continue
+        runs.append((ref['source_id'], ref['page_index'], ref['page_index'], ref['rotation']))
+    return runs
+
+def merge_pdfs_pymupdf(pdf_list, sources, add_toc=True, page_num_position='bottom-center', start_num=1):
+    """merge_pdfs on PyMuPDF: one pass, straight from the source documents
+
+    Consecutive pages are copied with one insert_pdf call per run, numbers
+    are stamped with insert_text on the merged pages, and the result is
+    saved once with garbage collection and duplicate-object merging.
+    """
+    merged = fitz.open()
+    opened = {}
+    try:
+        if add_toc:
+            with fitz.open(stream=create_toc_page(toc_entries_for(pdf_list, add_toc)), filetype="pdf") as toc:
+                merged.insert_pdf(toc)
+        
+        for pdf_info in pdf_list:
+            for source_id, first, last, rotation in page_runs(pdf_info['pages']):
+                if source_id not in opened:
+                    opened[source_id] = fitz.open(stream=sources[source_id].pdf_bytes, filetype="pdf")
+                start = merged.page_count
+                merged.insert_pdf(opened[source_id], from_page=first, to_page=last)
+                if rotation:
+                    for page_index in range(start, merged.page_count):
+                        page = merged[page_index]
+                        page.set_rotation((page.rotation + rotation) % 360)
+        
+        if page_num_position != 'none':
+            for page_index, page in enumerate(merged):
+                # Unrotated page space, as the pypdf overlay uses; PyMuPDF's
+                # origin is the cropbox's top-left corner
+                crop_width, crop_height = page.cropbox.width, page.cropbox.height
+                x, y = page_number_point(page_num_position, crop_width, crop_height)
+                label = str(page_index + start_num)
+                x -= fitz.get_text_length(label, fontname="helv", fontsize=10) / 2
+                page.insert_text((x, crop_height - y), label, fontname="helv", fontsize=10)
+        
+        return merged.tobytes(garbage=4, deflate=True, deflate_fonts=True)
+    finally:
+        for doc in opened.values():
+            doc.close()
+        merged.close()
+
+def write_pages_pdf(pages, sources):
+    """Write referenced pages, in order, as a single PDF"""
+    writer = pypdf.PdfWriter()
+    add_referenced_pages(writer, pages, sources)
+    output = BytesIO()
+    writer.write(output)
+    output.seek(0)
+    return output.read()
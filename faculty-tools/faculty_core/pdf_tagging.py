@@ -0,0 +1,131 @@
+# pdf_tagging.py
+"""Heading detection and tagging for the PDF accessibility tagger"""
+
+from io import BytesIO
+
+from ._lazy import lazy_import
+from .extraction import get_text_blocks
+from .instrumentation import NULL_RECORDER
+from .text_elements import TextLine
+
+fitz = lazy_import('fitz')  # PyMuPDF
+pypdf = lazy_import('pypdf')
+
+# Bump when analysis output changes so cached results are not reused
+PIPELINE_VERSION = 1
+
+
+def analyze_pdf_hierarchy(pdf_bytes, recorder=NULL_RECORDER):
+    """Analyze PDF to detect text hierarchy based on multiple factors"""
+    with recorder.stage('extraction') as record:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        text_elements = []
+    
+        for page_num, page in enumerate(doc):
+            blocks = get_text_blocks(page)
+        
+            for block in blocks:
+                if block["type"] == 0:  # Text block
+                    for line in block["lines"]:
+                        # Combine all spans in a line into one element
+                        line_text = " ".join(span["text"] for span in line["spans"]).strip()
+                    
+                        if line_text and len(line_text) > 1:  # Skip single characters
+                            # Get the largest font in this line (usually the dominant one)
+                            max_font_size = max(span["size"] for span in line["spans"])
+                            fonts = [span["font"] for span in line["spans"]]
+                            is_bold = any("Bold" in font for font in fonts)
+                            is_italic = any("Italic" in font or "Oblique" in font for font in fonts)
+                        
+                            # Get vertical position on page
+                            y_position = line["bbox"][1]
+                        
+                            text_elements.append(TextLine(
+                                page=page_num + 1,
+                                text=line_text,
+                                font_size=max_font_size,
+                                fonts=fonts,
+                                bold=is_bold,
+                                italic=is_italic,
+                                y_position=y_position,
+                                char_count=len(line_text),
+                                word_count=len(line_text.split()),
+                                suggested_tag=None,
+                                user_tag=None
+                            ))
+        doc.close()
+        record['count'] = len(text_elements)
+
+    with recorder.stage('tag_suggestion') as record:
+        # Analyze patterns to suggest tags
+        if text_elements:
+            # Look for common patterns
+            for i, elem in enumerate(text_elements):
+                text = elem['text']
+                char_count = elem['char_count']
+                word_count = elem['word_count']
+            
+                # Skip very long paragraphs
+                if char_count > 300:
+                    elem['suggested_tag'] = 'Body Text'
+                    elem['user_tag'] = 'Body Text'
+                    continue
+            
+                # Pattern 1: Short lines (likely titles or headings)
+                if char_count < 100 and word_count <= 10:
+                    # Check if it's isolated (has space before/after)
+                    has_space_before = i == 0 or text_elements[i-1]['char_count'] > 200
+                    has_space_after = i == len(text_elements)-1 or text_elements[i+1]['char_count'] > 200
+                
+                    if has_space_before or has_space_after:
+                        # Check position on page (titles often at top)
+                        if elem['y_position'] < 200:
+                            elem['suggested_tag'] = 'H1'
+                        else:
+                            # Look for name patterns (likely author names)
+                            words = text.split()
+                            # Check if it looks like a name (2-4 capitalized words)
+                            if 2 <= word_count <= 4 and all(w[0].isupper() for w in words if w):
+                                elem['suggested_tag'] = 'H2'
+                            else:
+                                elem['suggested_tag'] = 'H2'
+                    else:
+                        elem['suggested_tag'] = 'H3'
+            
+                # Pattern 2: Moderate length (50-200 chars)
+                elif 50 <= char_count <= 200:
+                    if elem['bold'] or elem['italic']:
+                        elem['suggested_tag'] = 'H3'
+                    else:
+                        elem['suggested_tag'] = 'Body Text'
+            
+                # Pattern 3: Everything else is body text
+                else:
+                    elem['suggested_tag'] = 'Body Text'
+            
+                elem['user_tag'] = elem['suggested_tag']
+        record['count'] = len(text_elements)
+
+    return text_elements
+
+def create_tagged_pdf(original_pdf_bytes, text_elements):
+    """Create a tagged PDF with accessibility markup"""
+    # For now, we'll return a modified version
+    # In production, you'd use pikepdf or similar for full tagging
+    reader = pypdf.PdfReader(BytesIO(original_pdf_bytes))
+    writer = pypdf.PdfWriter()
+    
+    # Copy all pages
+    for page in reader.pages:
+        writer.add_page(page)
+    
+    # Add metadata
+    writer.add_metadata({
+        '/Title': 'Accessible Document',
+        '/Tagged': 'True'
+    })
+    
+    output = BytesIO()
+    writer.write(output)
+    output.seek(0)
+    return output.read()
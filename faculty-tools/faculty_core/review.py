@@ -0,0 +1,49 @@
+# review.py
+"""Element IDs, search and paging for the tag review steps
+
+Review widgets are keyed by a stable element_id instead of the element's
+list position, and an id -> position map finds the element again in O(1)
+when a widget changes. Only one page of the (filtered) element list is
+rendered on each rerun.
+"""
+
+import math
+
+REVIEW_PAGE_SIZES = [25, 50, 100, 200]
+
+
+def assign_element_ids(elements):
+    """Number elements in document order; returns the id -> position map"""
+    for position, elem in enumerate(elements):
+        elem['element_id'] = position
+    return element_positions(elements)
+
+
+def element_positions(elements):
+    """Map element_id -> current list position"""
+    return {elem['element_id']: position for position, elem in enumerate(elements)}
+
+
+def filter_elements(elements, tags=None, query='', min_chars=None, max_chars=None):
+    """Elements with one of tags whose text contains query (case-insensitive)"""
+    query = query.strip().lower()
+    return [
+        elem for elem in elements
+        if (tags is None or elem['user_tag'] in tags)
+        and (min_chars is None or elem['char_count'] > min_chars)
+        and (max_chars is None or elem['char_count'] < max_chars)
+        and (not query or query in elem['text'].lower())
+    ]
+
+
+def count_pages(item_count, page_size):
+    """Pages needed to show item_count items (at least one)"""
+    return max(1, math.ceil(item_count / page_size))
+
+
+def page_window(items, page, page_size):
+    """(visible items, page, page_count) for 1-based page, clamped into range"""
+    page_count = count_pages(len(items), page_size)
+    page = min(max(1, page), page_count)
+    start = (page - 1) * page_size
+    return items[start:start + page_size], page, page_count
@@ -0,0 +1,162 @@
+# tag_rules.py
+"""Rule-based bulk tag reassignment for the accessibility tagger
+
+Rules are short phrases, one per line:
+
+    14pt bold -> H2
+    page 1 y<200 -> H1
+    everything on pages 3-5 above y=100 -> Body Text
+    size>20 -> H1
+
+Each rule becomes a dict of conditions. apply_tag_rules builds NumPy arrays
+of the element fields once and evaluates every rule as a vectorized mask;
+later rules win where rules overlap, and only elements whose tag actually
+changes are written back.
+"""
+
+import re
+
+from ._lazy import lazy_import
+
+np = lazy_import('numpy')
+
+RULE_TAGS = ['H1', 'H2', 'H3', 'Body Text']
+
+# "14pt" matches 13.75-14.25pt, the precision PDF sizes are shown with
+SIZE_TOLERANCE = 0.25
+
+# Words that read naturally in a rule but add no condition
+FILLER_WORDS = {'all', 'everything', 'every', 'line', 'lines', 'text', 'on', 'with', 'the', 'and', 'in'}
+
+TARGET_SEPARATOR = re.compile(r'\s*(?:->|→|=>)\s*')
+COMPARISON = re.compile(r'^(y|size)(<=|>=|<|>|=)(\d+(?:\.\d+)?)$')
+POINT_SIZE = re.compile(r'^(\d+(?:\.\d+)?)pt$')
+PAGE_SPEC = re.compile(r'^(\d+)(?:-(\d+))?$')
+
+
+def parse_tag_target(text):
+    """Normalize "h2", "H2", "body" or "body text" to a tag name"""
+    key = text.strip().lower()
+    for tag in RULE_TAGS:
+        if key == tag.lower():
+            return tag
+    if key in ('body', 'p', 'paragraph'):
+        return 'Body Text'
+    raise ValueError(f'Unknown tag "{text.strip()}" (use H1, H2, H3 or Body Text)')
+
+
+def parse_tag_rule(text):
+    """Parse one rule line into a dict of conditions plus 'tag'
+
+    Raises ValueError describing the part that couldn't be understood.
+    """
+    parts = TARGET_SEPARATOR.split(text.strip(), maxsplit=1)
+    if len(parts) != 2 or not parts[1]:
+        raise ValueError(f'"{text.strip()}" needs a target, e.g. "14pt bold -> H2"')
+    condition_text, target = parts
+    rule = {'tag': parse_tag_target(target)}
+
+    # Join comparisons written with spaces ("y < 200") into one token
+    condition_text = re.sub(r'\s*(<=|>=|<|>|=)\s*', r'\1', condition_text.lower())
+    tokens = condition_text.split()
+    position = 0
+    while position < len(tokens):
+        token = tokens[position]
+        position += 1
+        if token in FILLER_WORDS:
+            continue
+        if token in ('bold', 'italic'):
+            rule[token] = True
+        elif token in ('regular', 'plain'):
+            rule['bold'] = False
+            rule['italic'] = False
+        elif token in ('page', 'pages'):
+            if position == len(tokens) or not PAGE_SPEC.match(tokens[position]):
+                raise ValueError(f'"{token}" must be followed by a page or range, e.g. page 1 or pages 3-5')
+            first, last = PAGE_SPEC.match(tokens[position]).groups()
+            rule['first_page'] = int(first)
+            rule['last_page'] = int(last or first)
+            position += 1
+        elif token in ('above', 'below'):
+            # "above y=200" reads as y<200: PDF y grows downwards
+            if position == len(tokens) or not COMPARISON.match(tokens[position]):
+                raise ValueError(f'"{token}" must be followed by a position, e.g. above y=200')
+            _, _, value = COMPARISON.match(tokens[position]).groups()
+            rule['max_y' if token == 'above' else 'min_y'] = float(value)
+            position += 1
+        elif POINT_SIZE.match(token):
+            size = float(POINT_SIZE.match(token).group(1))
+            rule['min_size'] = size - SIZE_TOLERANCE
+            rule['max_size'] = size + SIZE_TOLERANCE
+        elif COMPARISON.match(token):
+            field, operator, value = COMPARISON.match(token).groups()
+            value = float(value)
+            prefix = 'y' if field == 'y' else 'size'
+            if operator in ('<', '<='):
+                rule[f'max_{prefix}'] = value if operator == '<=' else float(np.nextafter(value, -np.inf))
+            elif operator in ('>', '>='):
+                rule[f'min_{prefix}'] = value if operator == '>=' else float(np.nextafter(value, np.inf))
+            else:
+                tolerance = SIZE_TOLERANCE if field == 'size' else 0
+                rule[f'min_{prefix}'] = value - tolerance
+                rule[f'max_{prefix}'] = value + tolerance
+        else:
+            raise ValueError(f'Don\'t understand "{token}" in "{text.strip()}"')
+    return rule
+
+
+def parse_tag_rules(text):
+    """Parse one rule per line, skipping blank lines and # comments"""
+    rules = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if line:
+            rules.append(parse_tag_rule(line))
+    return rules
+
+
+def element_columns(elements):
+    """Field arrays the rules are evaluated against"""
+    count = len(elements)
+    return {
+        'page': np.fromiter((e['page'] for e in elements), dtype='i4', count=count),
+        'size': np.fromiter((e['font_size'] for e in elements), dtype='f8', count=count),
+        'y': np.fromiter((e['y_position'] for e in elements), dtype='f8', count=count),
+        'bold': np.fromiter((bool(e['bold']) for e in elements), dtype='?', count=count),
+        'italic': np.fromiter((bool(e['italic']) for e in elements), dtype='?', count=count),
+    }
+
+
+def rule_mask(columns, rule):
+    """Boolean mask of the elements a rule applies to"""
+    mask = np.ones(len(columns['page']), dtype='?')
+    if 'first_page' in rule:
+        mask &= (columns['page'] >= rule['first_page']) & (columns['page'] <= rule['last_page'])
+    for field in ('size', 'y'):
+        if f'min_{field}' in rule:
+            mask &= columns[field] >= rule[f'min_{field}']
+        if f'max_{field}' in rule:
+            mask &= columns[field] <= rule[f'max_{field}']
+    for flag in ('bold', 'italic'):
+        if flag in rule:
+            mask &= columns[flag] == rule[flag]
+    return mask
+
+
+def apply_tag_rules(elements, rules):
+    """Apply rules in order (later rules win); returns the number of tags changed"""
+    if not elements or not rules:
+        return 0
+    columns = element_columns(elements)
+    codes = np.full(len(elements), -1, dtype='i1')
+    for rule in rules:
+        codes[rule_mask(columns, rule)] = RULE_TAGS.index(rule['tag'])
+
+    changed = 0
+    for position in np.flatnonzero(codes >= 0).tolist():
+        tag = RULE_TAGS[codes[position]]
+        if elements[position]['user_tag'] != tag:
+            elements[position]['user_tag'] = tag
+            changed += 1
+    return changed
+
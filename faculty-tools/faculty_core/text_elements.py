@@ -0,0 +1,92 @@
+# text_elements.py
+"""Compact records for text extracted from PDFs
+
+Each extracted line used to be a dict with about a dozen keys. These records
+keep the same fields in __slots__ (several times smaller than a dict) while
+still supporting elem['key'], elem.get(), 'key' in elem and copy(), so code
+written against the dicts keeps working.
+"""
+
+
+class SlotRecord:
+    """Base class giving __slots__ records a dict-like interface"""
+
+    __slots__ = ()
+    _fields = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = frozenset(cls.__slots__)
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            self[name] = value
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fields and hasattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in self._fields:
+            return default
+        return getattr(self, key, default)
+
+    def keys(self):
+        return [name for name in self.__slots__ if hasattr(self, name)]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def copy(self):
+        """Shallow copy, like dict.copy()"""
+        new = object.__new__(type(self))
+        for name in self.keys():
+            setattr(new, name, getattr(self, name))
+        return new
+
+    def as_dict(self):
+        """Plain dict (nested records converted too), e.g. for JSON"""
+        result = {}
+        for name, value in self.items():
+            if isinstance(value, list):
+                value = [v.as_dict() if isinstance(v, SlotRecord) else v for v in value]
+            result[name] = value
+        return result
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={value!r}' for name, value in self.items())
+        return f'{type(self).__name__}({fields})'
+
+
+class TextSpan(SlotRecord):
+    """A run of text with uniform bold/italic formatting"""
+
+    __slots__ = ('text', 'bold', 'italic')
+
+
+class TextLine(SlotRecord):
+    """One extracted line (or merged block) of text with its font metadata"""
+
+    __slots__ = (
+        'page', 'text', 'formatted_spans', 'font_size', 'fonts', 'bold', 'italic',
+        'char_count', 'word_count', 'y_position', 'page_height',
+        'suggested_tag', 'user_tag', 'element_id',
+    )
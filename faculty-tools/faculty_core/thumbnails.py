@@ -0,0 +1,172 @@
+# thumbnails.py
+"""On-demand page thumbnails for the PDF editor, rendered in the background
+
+Nothing is rendered at upload. When the edit view opens it asks for the
+pages it shows; missing thumbnails are queued on a background executor and
+the view reruns until they have all arrived, so the grid fills in
+progressively. Thumbnails are cached as raw PNG bytes keyed by
+(content hash, page index, scale), so the same file uploaded twice, or
+opened again later, is never rendered twice.
+
+The edit grid shows the thumbnails as sprite sheets: tiles of up to
+SHEET_PAGES pages composed into one PNG with a label under each page. A
+rerun then sends a few images instead of one per page, and tiles whose
+pages didn't change are cached, so the browser gets the same image back.
+
+MuPDF isn't thread-safe, so the executor has a single worker and every
+MuPDF call here holds MUPDF_LOCK: rendering happens off the script thread
+but one page (or sheet) at a time.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from ._lazy import lazy_import
+
+fitz = lazy_import('fitz')  # PyMuPDF
+
+THUMBNAIL_SCALE = 0.3
+# About 10 KB each at the default scale
+THUMBNAIL_CACHE_ENTRIES = 5000
+# Pages rendered per queued task; results are published after each page
+THUMBNAIL_BATCH_PAGES = 16
+
+SHEET_COLUMNS = 6
+SHEET_ROWS = 4
+SHEET_PAGES = SHEET_COLUMNS * SHEET_ROWS
+SHEET_CACHE_ENTRIES = 200
+# Cell size in pixels: a letter page at THUMBNAIL_SCALE plus padding and label
+SHEET_CELL_WIDTH = 196
+SHEET_CELL_HEIGHT = 250
+SHEET_LABEL_HEIGHT = 18
+SHEET_PADDING = 6
+
+MUPDF_LOCK = threading.Lock()
+
+
+def render_thumbnails(pdf_bytes, page_indices, scale=THUMBNAIL_SCALE):
+    """Yield (page_index, png_bytes) for page_indices of one document"""
+    with MUPDF_LOCK:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        matrix = fitz.Matrix(scale, scale)
+        for page_index in page_indices:
+            with MUPDF_LOCK:
+                image = doc[page_index].get_pixmap(matrix=matrix).tobytes("png")
+            yield page_index, image
+    finally:
+        with MUPDF_LOCK:
+            doc.close()
+
+
+def compose_sheet(cells, columns=SHEET_COLUMNS):
+    """One PNG of (label, png_bytes or None, rotation) cells in a grid
+
+    Missing images are drawn as grey placeholders.
+    """
+    rows = max(1, -(-len(cells) // columns))
+    row_height = SHEET_CELL_HEIGHT + SHEET_LABEL_HEIGHT
+    with MUPDF_LOCK:
+        doc = fitz.open()
+        try:
+            page = doc.new_page(width=min(len(cells), columns) * SHEET_CELL_WIDTH, height=rows * row_height)
+            for position, (label, image, rotation) in enumerate(cells):
+                row, column = divmod(position, columns)
+                x0 = column * SHEET_CELL_WIDTH
+                y0 = row * row_height
+                rect = fitz.Rect(x0 + SHEET_PADDING, y0 + SHEET_PADDING,
+                                 x0 + SHEET_CELL_WIDTH - SHEET_PADDING, y0 + SHEET_CELL_HEIGHT)
+                if image is not None:
+                    # insert_image turns anti-clockwise; page rotation is clockwise
+                    page.insert_image(rect, stream=image, rotate=-rotation % 360)
+                else:
+                    page.draw_rect(rect, color=(0.8, 0.8, 0.8), fill=(0.95, 0.95, 0.95))
+                page.insert_text((x0 + SHEET_PADDING, y0 + row_height - 5), label,
+                                 fontsize=11, color=(0.2, 0.25, 0.33))
+            return page.get_pixmap().tobytes("png")
+        finally:
+            doc.close()
+
+
+class ThumbnailCache:
+    """LRU cache of PNG thumbnails plus the background renderer that fills it"""
+
+    def __init__(self, max_entries=THUMBNAIL_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._images = OrderedDict()
+        self._queued = set()
+        # Pages that failed to render aren't queued again
+        self._failed = set()
+        self._sheets = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbnails')
+
+    def get(self, source_id, page_index, scale=THUMBNAIL_SCALE):
+        """PNG bytes, or None if not rendered (yet) or rendering failed"""
+        key = (source_id, page_index, scale)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def request(self, source, page_indices, scale=THUMBNAIL_SCALE):
+        """Queue the pages of a PdfSource that are neither cached nor queued
+
+        Returns the number of requested pages still outstanding (pages that
+        failed to render don't count).
+        """
+        with self._lock:
+            missing = [i for i in page_indices
+                       if (source.source_id, i, scale) not in self._images
+                       and (source.source_id, i, scale) not in self._failed]
+            new = [i for i in missing if (source.source_id, i, scale) not in self._queued]
+            self._queued.update((source.source_id, i, scale) for i in new)
+        for start in range(0, len(new), THUMBNAIL_BATCH_PAGES):
+            self._executor.submit(self._render, source.source_id, source.pdf_bytes,
+                                  new[start:start + THUMBNAIL_BATCH_PAGES], scale)
+        return len(missing)
+
+    def sheet(self, pages, labels, scale=THUMBNAIL_SCALE, columns=SHEET_COLUMNS):
+        """Sprite sheet PNG for page references (source_id, page_index, rotation)
+
+        Cached by the pages, labels and which thumbnails were available, so a
+        tile is composed again only when one of those changes.
+        """
+        cells = [(label, self.get(page['source_id'], page['page_index'], scale), page['rotation'])
+                 for page, label in zip(pages, labels)]
+        key = (columns, scale, tuple(
+            (page['source_id'], page['page_index'], rotation, label, image is not None)
+            for page, (label, image, rotation) in zip(pages, cells)
+        ))
+        with self._lock:
+            sheet = self._sheets.get(key)
+            if sheet is not None:
+                self._sheets.move_to_end(key)
+                return sheet
+        sheet = compose_sheet(cells, columns)
+        with self._lock:
+            self._sheets[key] = sheet
+            while len(self._sheets) > SHEET_CACHE_ENTRIES:
+                self._sheets.popitem(last=False)
+        return sheet
+
+    def _render(self, source_id, pdf_bytes, page_indices, scale):
+        try:
+            for page_index, image in render_thumbnails(pdf_bytes, page_indices, scale):
+                key = (source_id, page_index, scale)
+                with self._lock:
+                    self._images[key] = image
+                    self._queued.discard(key)
+                    while len(self._images) > self.max_entries:
+                        self._images.popitem(last=False)
+        except Exception:
+            with self._lock:
+                unrendered = {(source_id, i, scale) for i in page_indices} & self._queued
+                self._failed.update(unrendered)
+                self._queued.difference_update(unrendered)
+
+
+# Shared by every session: keys are content hashes, so entries can't collide
+THUMBNAILS = ThumbnailCache()
@@ -1,8 +1,11 @@
+import pandas as pd
 import streamlit as st
-from pypdf import PdfReader, PdfWriter
-from io import BytesIO
-import fitz  # PyMuPDF
-from collections import defaultdict
+
+from faculty_core.analysis_cache import load_cached_analysis, store_cached_analysis
+from faculty_core.instrumentation import finish_recording, stage_recorder
+from faculty_core.pdf_tagging import PIPELINE_VERSION, analyze_pdf_hierarchy, create_tagged_pdf
+from faculty_core.review import REVIEW_PAGE_SIZES, assign_element_ids, count_pages, filter_elements, page_window
+from faculty_core.tag_rules import RULE_TAGS, apply_tag_rules, parse_tag_rules
 
 st.set_page_config(page_title="PDF Accessibility Tagger", page_icon="🏷️", layout="wide")
 
@@ -127,117 +130,6 @@ if 'text_elements' not in st.session_state:
 if 'current_step' not in st.session_state:
     st.session_state.current_step = 1
 
-def analyze_pdf_hierarchy(pdf_bytes):
-    """Analyze PDF to detect text hierarchy based on multiple factors"""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    text_elements = []
-    
-    for page_num, page in enumerate(doc):
-        blocks = page.get_text("dict")["blocks"]
-        
-        for block in blocks:
-            if block["type"] == 0:  # Text block
-                for line in block["lines"]:
-                    # Combine all spans in a line into one element
-                    line_text = " ".join(span["text"] for span in line["spans"]).strip()
-                    
-                    if line_text and len(line_text) > 1:  # Skip single characters
-                        # Get the largest font in this line (usually the dominant one)
-                        max_font_size = max(span["size"] for span in line["spans"])
-                        fonts = [span["font"] for span in line["spans"]]
-                        is_bold = any("Bold" in font for font in fonts)
-                        is_italic = any("Italic" in font or "Oblique" in font for font in fonts)
-                        
-                        # Get vertical position on page
-                        y_position = line["bbox"][1]
-                        
-                        text_elements.append({
-                            'page': page_num + 1,
-                            'text': line_text,
-                            'font_size': max_font_size,
-                            'fonts': fonts,
-                            'bold': is_bold,
-                            'italic': is_italic,
-                            'y_position': y_position,
-                            'char_count': len(line_text),
-                            'word_count': len(line_text.split()),
-                            'suggested_tag': None,
-                            'user_tag': None
-                        })
-    
-    # Analyze patterns to suggest tags
-    if text_elements:
-        # Look for common patterns
-        for i, elem in enumerate(text_elements):
-            text = elem['text']
-            char_count = elem['char_count']
-            word_count = elem['word_count']
-            
-            # Skip very long paragraphs
-            if char_count > 300:
-                elem['suggested_tag'] = 'Body Text'
-                elem['user_tag'] = 'Body Text'
-                continue
-            
-            # Pattern 1: Short lines (likely titles or headings)
-            if char_count < 100 and word_count <= 10:
-                # Check if it's isolated (has space before/after)
-                has_space_before = i == 0 or text_elements[i-1]['char_count'] > 200
-                has_space_after = i == len(text_elements)-1 or text_elements[i+1]['char_count'] > 200
-                
-                if has_space_before or has_space_after:
-                    # Check position on page (titles often at top)
-                    if elem['y_position'] < 200:
-                        elem['suggested_tag'] = 'H1'
-                    else:
-                        # Look for name patterns (likely author names)
-                        words = text.split()
-                        # Check if it looks like a name (2-4 capitalized words)
-                        if 2 <= word_count <= 4 and all(w[0].isupper() for w in words if w):
-                            elem['suggested_tag'] = 'H2'
-                        else:
-                            elem['suggested_tag'] = 'H2'
-                else:
-                    elem['suggested_tag'] = 'H3'
-            
-            # Pattern 2: Moderate length (50-200 chars)
-            elif 50 <= char_count <= 200:
-                if elem['bold'] or elem['italic']:
-                    elem['suggested_tag'] = 'H3'
-                else:
-                    elem['suggested_tag'] = 'Body Text'
-            
-            # Pattern 3: Everything else is body text
-            else:
-                elem['suggested_tag'] = 'Body Text'
-            
-            elem['user_tag'] = elem['suggested_tag']
-    
-    doc.close()
-    return text_elements
-
-def create_tagged_pdf(original_pdf_bytes, text_elements):
-    """Create a tagged PDF with accessibility markup"""
-    # For now, we'll return a modified version
-    # In production, you'd use pikepdf or similar for full tagging
-    reader = PdfReader(BytesIO(original_pdf_bytes))
-    writer = PdfWriter()
-    
-    # Copy all pages
-    for page in reader.pages:
-        writer.add_page(page)
-    
-    # Add metadata
-    writer.add_metadata({
-        '/Title': 'Accessible Document',
-        '/Tagged': 'True'
-    })
-    
-    output = BytesIO()
-    writer.write(output)
-    output.seek(0)
-    return output.read()
-
 # Header
 st.markdown('<div class="main-header">PDF Accessibility Tagger</div>', unsafe_allow_html=True)
 st.markdown('<div class="subtitle">Make your PDF documents accessible for screen readers by adding proper heading tags and structure</div>', unsafe_allow_html=True)
@@ -289,12 +181,68 @@ uploaded_file = st.file_uploader(
     help="Upload the PDF you want to make accessible"
 )
 
+debug_mode = st.checkbox(
+    "Record stage timings (debug)",
+    value=False,
+    help="Time each processing step and track peak memory. Slows processing down somewhat."
+)
+
+
+def set_element_tag(elem_id):
+    """Selectbox callback: write the new tag to the element through the id map"""
+    position = st.session_state.element_positions[elem_id]
+    st.session_state.text_elements[position]['user_tag'] = st.session_state[f"tag_{elem_id}"]
+
+
+def bump_bulk_editor():
+    """Give the table a fresh key so it redraws from the element list"""
+    st.session_state.bulk_editor_version = st.session_state.get('bulk_editor_version', 0) + 1
+
+
+def apply_tag_rules_text():
+    """Button callback: parse the rules box and retag the whole document"""
+    try:
+        rules = parse_tag_rules(st.session_state.tag_rules_text)
+    except ValueError as e:
+        st.session_state.bulk_message = ('error', str(e))
+        return
+    changed = apply_tag_rules(st.session_state.text_elements, rules)
+    st.session_state.bulk_message = ('success', f"Rules applied: {changed} tags changed.")
+    bump_bulk_editor()
+
+
+def save_bulk_table():
+    """Form callback: write every edited Tag cell back in one rerun"""
+    editor_key = f"bulk_editor_{st.session_state.get('bulk_editor_version', 0)}"
+    edited_rows = st.session_state[editor_key]['edited_rows']
+    changed = 0
+    for row, values in edited_rows.items():
+        if 'Tag' in values:
+            position = st.session_state.element_positions[st.session_state.bulk_table_ids[int(row)]]
+            elem = st.session_state.text_elements[position]
+            if elem['user_tag'] != values['Tag']:
+                elem['user_tag'] = values['Tag']
+                changed += 1
+    st.session_state.bulk_message = ('success', f"Saved {changed} tag changes.")
+    bump_bulk_editor()
+
+
 if uploaded_file:
     if not st.session_state.pdf_uploaded:
         with st.spinner("Analyzing PDF structure..."):
             pdf_bytes = uploaded_file.read()
             st.session_state.pdf_bytes = pdf_bytes
-            st.session_state.text_elements = analyze_pdf_hierarchy(pdf_bytes)
+            recorder = stage_recorder('pdf-accessibility', uploaded_file.name, debug_mode)
+            # Reuse a previous analysis of the same file if we have one
+            with recorder.stage('cache_lookup') as record:
+                text_elements = load_cached_analysis(pdf_bytes, 'pdf-accessibility', PIPELINE_VERSION)
+                record['count'] = len(text_elements) if text_elements is not None else None
+            if text_elements is None:
+                text_elements = analyze_pdf_hierarchy(pdf_bytes, recorder=recorder)
+                store_cached_analysis(pdf_bytes, 'pdf-accessibility', PIPELINE_VERSION, text_elements)
+            st.session_state.text_elements = text_elements
+            st.session_state.element_positions = assign_element_ids(text_elements)
+            finish_recording(recorder, st.session_state.setdefault('stage_metrics', []))
             st.session_state.pdf_uploaded = True
             st.session_state.current_step = 2
         st.rerun()
@@ -334,47 +282,112 @@ if st.session_state.pdf_uploaded and st.session_state.text_elements:
             ["All Elements", "Only Headings (H1, H2, H3)", "Only Body Text"],
             horizontal=True
         )
+    with col_filter2:
+        page_size = st.selectbox("Per page", REVIEW_PAGE_SIZES, index=1, key="element_page_size")
     
-    # Display text elements for review
-    st.markdown("### Text Elements")
-    st.markdown("Use the dropdown next to each text element to change its tag type.")
+    search_query = st.text_input("Search text", placeholder="Filter elements by text", key="element_query")
     
-    elements_to_show = st.session_state.text_elements
+    filter_tags = None
     if filter_option == "Only Headings (H1, H2, H3)":
-        elements_to_show = [e for e in elements_to_show if e['user_tag'] in ['H1', 'H2', 'H3']]
+        filter_tags = ['H1', 'H2', 'H3']
     elif filter_option == "Only Body Text":
-        elements_to_show = [e for e in elements_to_show if e['user_tag'] == 'Body Text']
+        filter_tags = ['Body Text']
+    matching_elements = filter_elements(st.session_state.text_elements, tags=filter_tags, query=search_query)
+    
+    editing_mode = st.radio(
+        "Editing mode:",
+        ["One at a time", "Bulk table and rules"],
+        horizontal=True,
+        key="editing_mode",
+        help="Bulk mode edits many tags in one table and saves them together, and can retag by rule."
+    )
+    
+    # Both modes show one page of the matching elements at a time
+    review_page = 1
+    if count_pages(len(matching_elements), page_size) > 1:
+        review_page = st.number_input("Page", min_value=1, value=1, key="element_page")
+    elements_to_show, review_page, page_count = page_window(matching_elements, review_page, page_size)
+    page_caption = f"Page {review_page} of {page_count} · showing {len(elements_to_show)} of {len(matching_elements)} elements"
     
-    for idx, elem in enumerate(elements_to_show):
-        original_idx = st.session_state.text_elements.index(elem)
+    if editing_mode == "Bulk table and rules":
+        st.markdown("### Tag Rules")
+        st.markdown("One rule per line. Rules apply to the whole document, in order; later rules win.")
+        st.text_area(
+            "Rules",
+            placeholder="14pt bold -> H2\npage 1 above y=200 -> H1\nsize<10 -> Body Text",
+            key="tag_rules_text",
+            label_visibility="collapsed"
+        )
+        st.button("Apply Rules", on_click=apply_tag_rules_text)
+        if st.session_state.get('bulk_message'):
+            level, message = st.session_state.bulk_message
+            (st.error if level == 'error' else st.success)(message)
         
-        col1, col2, col3 = st.columns([3, 2, 1])
+        st.markdown("### Text Elements")
+        st.markdown("Change tags in the **Tag** column, then save them all at once. Save before changing page: "
+                    "unsaved edits are dropped. Y is the distance from the top of the page in points.")
+        # The ids of the rows shown, so the save callback can map row -> element
+        st.session_state.bulk_table_ids = [elem['element_id'] for elem in elements_to_show]
+        table = pd.DataFrame({
+            'Page': [elem['page'] for elem in elements_to_show],
+            'Y': [round(elem['y_position']) for elem in elements_to_show],
+            'Text': [elem['text'][:200] for elem in elements_to_show],
+            'Size': [round(elem['font_size'], 1) for elem in elements_to_show],
+            'Bold': [elem['bold'] for elem in elements_to_show],
+            'Tag': [elem['user_tag'] for elem in elements_to_show],
+        })
+        with st.form("bulk_tag_form"):
+            st.data_editor(
+                table,
+                key=f"bulk_editor_{st.session_state.get('bulk_editor_version', 0)}",
+                column_config={
+                    'Text': st.column_config.TextColumn(width="large"),
+                    'Size': st.column_config.NumberColumn(format="%.1f pt"),
+                    'Tag': st.column_config.SelectboxColumn(options=RULE_TAGS, required=True),
+                },
+                disabled=['Page', 'Y', 'Text', 'Size', 'Bold'],
+                hide_index=True,
+                use_container_width=True
+            )
+            st.form_submit_button("Save Tag Changes", type="primary", on_click=save_bulk_table)
+        st.caption(page_caption)
+    else:
+        st.markdown("### Text Elements")
+        st.markdown("Use the dropdown next to each text element to change its tag type.")
+        st.caption(page_caption)
+    
+        # Only the visible window gets widgets; changes are written back through the id map
+        for idx, elem in enumerate(elements_to_show):
+            elem_id = elem['element_id']
         
-        with col1:
-            # Display text preview
-            tag_class = f"tag-{elem['user_tag'].lower().replace(' ', '-')}"
-            st.markdown(f"""
-                <div class="text-preview">
-                    <small style="color: #64748b;">Page {elem['page']}</small><br>
-                    {elem['text'][:200]}{'...' if len(elem['text']) > 200 else ''}
-                </div>
-            """, unsafe_allow_html=True)
+            col1, col2, col3 = st.columns([3, 2, 1])
         
-        with col2:
-            new_tag = st.selectbox(
-                "Tag Type",
-                ["H1", "H2", "H3", "Body Text"],
-                index=["H1", "H2", "H3", "Body Text"].index(elem['user_tag']),
-                key=f"tag_{original_idx}",
-                label_visibility="collapsed"
-            )
-            st.session_state.text_elements[original_idx]['user_tag'] = new_tag
+            with col1:
+                # Display text preview
+                tag_class = f"tag-{elem['user_tag'].lower().replace(' ', '-')}"
+                st.markdown(f"""
+                    <div class="text-preview">
+                        <small style="color: #64748b;">Page {elem['page']}</small><br>
+                        {elem['text'][:200]}{'...' if len(elem['text']) > 200 else ''}
+                    </div>
+                """, unsafe_allow_html=True)
+        
+            with col2:
+                st.selectbox(
+                    "Tag Type",
+                    ["H1", "H2", "H3", "Body Text"],
+                    index=["H1", "H2", "H3", "Body Text"].index(elem['user_tag']),
+                    key=f"tag_{elem_id}",
+                    label_visibility="collapsed",
+                    on_change=set_element_tag,
+                    args=(elem_id,)
+                )
         
-        with col3:
-            st.markdown(f"<div style='padding-top: 1rem;'><small>Font: {elem['font_size']:.1f}pt</small></div>", unsafe_allow_html=True)
+            with col3:
+                st.markdown(f"<div style='padding-top: 1rem;'><small>Font: {elem['font_size']:.1f}pt</small></div>", unsafe_allow_html=True)
         
-        if idx < len(elements_to_show) - 1:
-            st.markdown("<hr style='margin: 0.5rem 0; border: none; border-top: 1px solid #e2e8f0;'>", unsafe_allow_html=True)
+            if idx < len(elements_to_show) - 1:
+                st.markdown("<hr style='margin: 0.5rem 0; border: none; border-top: 1px solid #e2e8f0;'>", unsafe_allow_html=True)
     
     st.markdown("---")
     
@@ -387,7 +400,11 @@ if st.session_state.pdf_uploaded and st.session_state.text_elements:
     with col1:
         if st.button("Generate Accessible PDF", type="primary", use_container_width=True):
             with st.spinner("Creating accessible PDF..."):
-                tagged_pdf = create_tagged_pdf(st.session_state.pdf_bytes, st.session_state.text_elements)
+                recorder = stage_recorder('pdf-accessibility', uploaded_file.name, debug_mode)
+                with recorder.stage('pdf_generation') as record:
+                    tagged_pdf = create_tagged_pdf(st.session_state.pdf_bytes, st.session_state.text_elements)
+                    record['count'] = len(st.session_state.text_elements)
+                finish_recording(recorder, st.session_state.setdefault('stage_metrics', []))
                 st.session_state.tagged_pdf = tagged_pdf
                 st.success("Accessible PDF generated successfully!")
     
@@ -403,12 +420,22 @@ if st.session_state.pdf_uploaded and st.session_state.text_elements:
     
     with col3:
         if st.button("Start Over", use_container_width=True):
-            for key in ['pdf_uploaded', 'text_elements', 'pdf_bytes', 'tagged_pdf']:
+            for key in ['pdf_uploaded', 'text_elements', 'pdf_bytes', 'tagged_pdf', 'stage_metrics',
+                        'element_positions', 'bulk_message', 'bulk_table_ids']:
                 if key in st.session_state:
                     del st.session_state[key]
             st.session_state.current_step = 1
             st.rerun()
 
+# Debug panel
+if st.session_state.get('stage_metrics'):
+    with st.expander("Debug: stage timings", expanded=False):
+        st.caption("Count is the number of text elements each stage handled. "
+                   "Runs are also appended to the metrics log.")
+        for run in st.session_state.stage_metrics:
+            st.markdown(f"**{run['label']}** &mdash; {run['total_seconds']:.2f}s total")
+            st.dataframe(run['stages'], use_container_width=True, hide_index=True)
+
 # Footer
 st.markdown("---")
 st.markdown("""
@@ -1,10 +1,9 @@
 import streamlit as st
-from pypdf import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from io import BytesIO
-import fitz  # PyMuPDF for thumbnails
-import base64
+import time
+
+from faculty_core.extraction import parse_page_range
+from faculty_core.pdf_merge import MERGE_BACKENDS, PdfSource, extract_pages_from_pdf, merge_pdfs, move_pages, write_pages_pdf
+from faculty_core.thumbnails import SHEET_PAGES, THUMBNAILS
 
 st.set_page_config(page_title="PDF Merger & Editor", page_icon="📄", layout="wide")
 
@@ -28,140 +27,60 @@ st.markdown("""
 # Initialize session state
 if 'pdf_files' not in st.session_state:
     st.session_state.pdf_files = []
+# One parsed PdfSource per uploaded file; pages refer to them by source_id
+if 'pdf_sources' not in st.session_state:
+    st.session_state.pdf_sources = {}
 if 'file_uploader_key' not in st.session_state:
     st.session_state.file_uploader_key = 0
 if 'editing_file_idx' not in st.session_state:
     st.session_state.editing_file_idx = None
 
-def extract_pages_from_pdf(pdf_bytes):
-    """Extract individual pages from a PDF with thumbnails"""
-    reader = PdfReader(BytesIO(pdf_bytes))
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages = []
-    
-    for i, page in enumerate(reader.pages):
-        # Extract page as separate PDF
-        writer = PdfWriter()
-        writer.add_page(page)
-        output = BytesIO()
-        writer.write(output)
-        output.seek(0)
-        
-        # Generate thumbnail
-        fitz_page = doc[i]
-        pix = fitz_page.get_pixmap(matrix=fitz.Matrix(0.3, 0.3))  # Scale down for thumbnail
-        img_bytes = pix.tobytes("png")
-        thumbnail_base64 = base64.b64encode(img_bytes).decode()
-        
-        pages.append({
-            'page_num': i + 1,
-            'bytes': output.read(),
-            'thumbnail': thumbnail_base64
-        })
-    
-    doc.close()
-    return pages
+def drop_unused_sources():
+    """Forget sources no remaining page refers to"""
+    used = {page['source_id'] for pdf_file in st.session_state.pdf_files for page in pdf_file['pages']}
+    for source_id in list(st.session_state.pdf_sources):
+        if source_id not in used:
+            del st.session_state.pdf_sources[source_id]
 
-def add_page_numbers(input_pdf_bytes, position='bottom-center', start_num=1):
-    """Add page numbers to PDF"""
-    reader = PdfReader(BytesIO(input_pdf_bytes))
-    writer = PdfWriter()
-    
-    for page_num, page in enumerate(reader.pages):
-        packet = BytesIO()
-        can = canvas.Canvas(packet, pagesize=letter)
-        
-        page_width = float(page.mediabox.width)
-        page_height = float(page.mediabox.height)
-        
-        positions = {
-            'bottom-center': (page_width / 2, 30),
-            'bottom-right': (page_width - 50, 30),
-            'bottom-left': (50, 30),
-            'top-center': (page_width / 2, page_height - 30),
-            'top-right': (page_width - 50, page_height - 30),
-            'top-left': (50, page_height - 30),
-        }
-        
-        x, y = positions.get(position, (page_width / 2, 30))
-        
-        can.setFont("Helvetica", 10)
-        can.drawCentredString(x, y, str(page_num + start_num))
-        can.save()
-        
-        packet.seek(0)
-        overlay = PdfReader(packet)
-        page.merge_page(overlay.pages[0])
-        writer.add_page(page)
-    
-    output = BytesIO()
-    writer.write(output)
-    output.seek(0)
-    return output.read()
+def selected_pages(page_count):
+    """(start, stop) list positions typed in the page selection box, or None"""
+    try:
+        page_range = parse_page_range(st.session_state.get('page_selection', ''), page_count)
+    except ValueError:
+        return None
+    return None if page_range is None else (page_range[0] - 1, page_range[1])
 
-def create_toc_page(toc_entries):
-    """Create a table of contents page"""
-    packet = BytesIO()
-    can = canvas.Canvas(packet, pagesize=letter)
-    
-    can.setFont("Helvetica-Bold", 20)
-    can.drawString(50, 750, "Table of Contents")
-    
-    can.setFont("Helvetica", 12)
-    y_position = 700
-    
-    for entry in toc_entries:
-        if y_position < 50:
-            can.showPage()
-            y_position = 750
-        can.drawString(70, y_position, f"{entry['title']}")
-        can.drawRightString(550, y_position, f"Page {entry['page']}")
-        y_position -= 25
-    
-    can.save()
-    packet.seek(0)
-    return packet.read()
+def select_pages(start, stop):
+    """Point the selection box at list positions [start, stop)"""
+    st.session_state.page_selection = str(start + 1) if stop - start == 1 else f"{start + 1}-{stop}"
+
+def rotate_selected(idx):
+    """Button callback: rotate the selected pages 90° clockwise"""
+    pages = st.session_state.pdf_files[idx]['pages']
+    start, stop = selected_pages(len(pages))
+    for page_info in pages[start:stop]:
+        page_info['rotation'] = (page_info['rotation'] + 90) % 360
+
+def move_selected(idx, offset=None):
+    """Button callback: move the selected pages by offset, or to the "Move to" position"""
+    pages = st.session_state.pdf_files[idx]['pages']
+    start, stop = selected_pages(len(pages))
+    new_start = start + offset if offset is not None else st.session_state.move_to_position - 1
+    new_start = move_pages(pages, start, stop, new_start)
+    # The selection follows the pages
+    select_pages(new_start, new_start + stop - start)
+
+def remove_selected(idx):
+    """Button callback: remove the selected pages, and the file if none are left"""
+    pages = st.session_state.pdf_files[idx]['pages']
+    start, stop = selected_pages(len(pages))
+    del pages[start:stop]
+    st.session_state.page_selection = ''
+    if not pages:
+        st.session_state.pdf_files.pop(idx)
+        st.session_state.editing_file_idx = None
+        drop_unused_sources()
 
-def merge_pdfs(pdf_list, add_toc=True, page_num_position='bottom-center', start_num=1):
-    """Merge multiple PDFs with optional TOC and page numbers"""
-    writer = PdfWriter()
-    toc_entries = []
-    current_page = 1
-    
-    if add_toc:
-        current_page += 1
-    
-    all_pages = []
-    for pdf_info in pdf_list:
-        toc_entries.append({
-            'title': pdf_info['toc_title'],
-            'page': current_page
-        })
-        
-        # Add pages in order they appear in the pages list
-        for page_info in pdf_info['pages']:
-            reader = PdfReader(BytesIO(page_info['bytes']))
-            all_pages.append(reader.pages[0])
-            current_page += 1
-    
-    if add_toc:
-        toc_pdf_bytes = create_toc_page(toc_entries)
-        toc_reader = PdfReader(BytesIO(toc_pdf_bytes))
-        for page in toc_reader.pages:
-            writer.add_page(page)
-    
-    for page in all_pages:
-        writer.add_page(page)
-    
-    output = BytesIO()
-    writer.write(output)
-    output.seek(0)
-    merged_bytes = output.read()
-    
-    if page_num_position != 'none':
-        merged_bytes = add_page_numbers(merged_bytes, page_num_position, start_num)
-    
-    return merged_bytes
 
 # UI
 col_title, col_clear = st.columns([5, 1])
@@ -172,6 +91,7 @@ with col_clear:
     st.markdown("<br>", unsafe_allow_html=True)  # Add spacing
     if st.button("Reset All", use_container_width=True, help="Clear all uploaded files and start fresh"):
         st.session_state.pdf_files = []
+        st.session_state.pdf_sources = {}
         st.session_state.file_uploader_key += 1
         st.session_state.editing_file_idx = None
         st.rerun()
@@ -191,6 +111,14 @@ with st.sidebar:
     
     start_page_num = st.number_input("Start Page Number", min_value=1, value=1, step=1)
     
+    merge_backend = st.selectbox(
+        "Merge Engine",
+        options=MERGE_BACKENDS,
+        format_func={'pypdf': 'pypdf', 'pymupdf': 'PyMuPDF (faster, smaller files)'}.get,
+        index=0,
+        help="PyMuPDF copies page ranges straight from the uploads and stamps numbers in the same pass"
+    )
+    
     st.markdown("---")
     st.markdown("### Features")
     st.markdown("• Merge multiple PDFs")
@@ -212,11 +140,12 @@ uploaded_files = st.file_uploader(
 if uploaded_files:
     for uploaded_file in uploaded_files:
         if not any(f['name'] == uploaded_file.name for f in st.session_state.pdf_files):
-            pdf_bytes = uploaded_file.read()
-            pages = extract_pages_from_pdf(pdf_bytes)
+            source = PdfSource(uploaded_file.read(), uploaded_file.name)
+            st.session_state.pdf_sources.setdefault(source.source_id, source)
+            pages = extract_pages_from_pdf(source)
             st.session_state.pdf_files.append({
                 'name': uploaded_file.name,
-                'bytes': pdf_bytes,
+                'source_id': source.source_id,
                 'toc_title': uploaded_file.name.replace('.pdf', ''),
                 'pages': pages
             })
@@ -235,65 +164,76 @@ if st.session_state.editing_file_idx is not None:
         with col2:
             # Download single edited PDF
             if st.button("Download This PDF", use_container_width=True):
-                writer = PdfWriter()
-                for page_info in pdf_file['pages']:
-                    reader = PdfReader(BytesIO(page_info['bytes']))
-                    writer.add_page(reader.pages[0])
-                output = BytesIO()
-                writer.write(output)
-                output.seek(0)
-                
                 st.download_button(
                     label="Download",
-                    data=output.read(),
+                    data=write_pages_pdf(pdf_file['pages'], st.session_state.pdf_sources),
                     file_name=f"edited_{pdf_file['name']}",
                     mime="application/pdf"
                 )
         with col3:
             if st.button("Done", use_container_width=True):
                 st.session_state.editing_file_idx = None
+                st.session_state.pop('page_selection', None)
                 st.rerun()
         
         st.markdown("---")
         
-        # Display pages with thumbnails
-        for page_idx, page_info in enumerate(pdf_file['pages']):
-            col1, col2, col3, col4, col5 = st.columns([0.5, 1.5, 2, 1, 1])
-            
-            with col1:
-                st.markdown(f"**{page_idx + 1}**")
-            
-            with col2:
-                # Display thumbnail
-                st.image(
-                    f"data:image/png;base64,{page_info['thumbnail']}", 
-                    width=150
-                )
-            
-            with col3:
-                st.text(f"Original page {page_info['page_num']}")
-            
-            with col4:
-                col_up, col_down = st.columns(2)
-                with col_up:
-                    if st.button("↑", key=f"page_up_{page_idx}", disabled=(page_idx == 0)):
-                        pdf_file['pages'][page_idx], pdf_file['pages'][page_idx - 1] = \
-                            pdf_file['pages'][page_idx - 1], pdf_file['pages'][page_idx]
-                        st.rerun()
-                with col_down:
-                    if st.button("↓", key=f"page_down_{page_idx}", 
-                               disabled=(page_idx == len(pdf_file['pages']) - 1)):
-                        pdf_file['pages'][page_idx], pdf_file['pages'][page_idx + 1] = \
-                            pdf_file['pages'][page_idx + 1], pdf_file['pages'][page_idx]
-                        st.rerun()
-            
-            with col5:
-                if st.button("×", key=f"page_remove_{page_idx}", help="Remove this page"):
-                    pdf_file['pages'].pop(page_idx)
-                    if len(pdf_file['pages']) == 0:
-                        st.session_state.pdf_files.pop(idx)
-                        st.session_state.editing_file_idx = None
-                    st.rerun()
+        # Thumbnails render in the background; missing ones show as grey placeholders
+        source = st.session_state.pdf_sources[pdf_file['source_id']]
+        thumbnails_pending = THUMBNAILS.request(source, [page['page_index'] for page in pdf_file['pages']])
+        if thumbnails_pending:
+            st.caption(f"Rendering page previews… {thumbnails_pending} to go")
+        
+        # Page overview: a few sprite-sheet tiles instead of one image per page
+        pages = pdf_file['pages']
+        for start in range(0, len(pages), SHEET_PAGES):
+            tile = pages[start:start + SHEET_PAGES]
+            labels = [f"{start + offset + 1} · p.{page['page_num']}" for offset, page in enumerate(tile)]
+            st.image(THUMBNAILS.sheet(tile, labels))
+        
+        st.markdown("---")
+        
+        # One set of page controls acting on the selected pages, so the widget
+        # count doesn't grow with the document; numbers match the tile labels
+        page_count = len(pages)
+        st.text_input("Pages", placeholder=f"e.g. 3 or 5-8, of {page_count}", key="page_selection",
+                      help="Positions as numbered on the previews above")
+        try:
+            parse_page_range(st.session_state.page_selection, page_count)
+        except ValueError as e:
+            st.error(str(e))
+        selection = selected_pages(page_count)
+        no_selection = selection is None
+        
+        col1, col2, col3, col4, col5, col6 = st.columns([1, 1, 1, 1.2, 1, 1])
+        with col1:
+            st.button("Rotate ↻", use_container_width=True, disabled=no_selection,
+                      on_click=rotate_selected, args=(idx,), help="Rotate 90° clockwise")
+        with col2:
+            st.button("↑", use_container_width=True, disabled=no_selection or selection[0] == 0,
+                      on_click=move_selected, args=(idx, -1), help="Move up one place")
+        with col3:
+            st.button("↓", use_container_width=True, disabled=no_selection or selection[1] == page_count,
+                      on_click=move_selected, args=(idx, 1), help="Move down one place")
+        with col4:
+            st.number_input("Move to", min_value=1, value=1, key="move_to_position",
+                            label_visibility="collapsed")
+        with col5:
+            st.button("Move to", use_container_width=True, disabled=no_selection,
+                      on_click=move_selected, args=(idx,), help="Move so the first selected page lands at this position")
+        with col6:
+            st.button("Remove ×", use_container_width=True, disabled=no_selection,
+                      on_click=remove_selected, args=(idx,))
+        
+        if selection is not None:
+            chosen = pages[selection[0]:selection[1]]
+            originals = ', '.join(str(page_info['page_num']) for page_info in chosen[:10])
+            st.caption(f"{len(chosen)} selected · original page(s) {originals}{', …' if len(chosen) > 10 else ''}")
+
+        # Poll until the background renderer has caught up
+        if thumbnails_pending:
+            time.sleep(0.5)
+            st.rerun()
 
 # Main file list view
 elif st.session_state.pdf_files:
@@ -327,6 +267,7 @@ elif st.session_state.pdf_files:
         st.caption("Tip: Click 'Edit Pages' to reorder, remove pages, or download with page numbers")
         if st.button("🔄 Start Over", use_container_width=False):
             st.session_state.pdf_files = []
+            st.session_state.pdf_sources = {}
             st.session_state.file_uploader_key += 1
             st.rerun()
     
@@ -381,6 +322,7 @@ elif st.session_state.pdf_files:
                     with subcol4:
                         if st.button("×", key=f"remove_{idx}", help="Remove"):
                             st.session_state.pdf_files.pop(idx)
+                            drop_unused_sources()
                             st.rerun()
                 
                 st.markdown("---")
@@ -396,9 +338,11 @@ elif st.session_state.pdf_files:
                     try:
                         merged_pdf = merge_pdfs(
                             st.session_state.pdf_files,
+                            st.session_state.pdf_sources,
                             add_toc=add_toc,
                             page_num_position=page_num_position,
-                            start_num=start_page_num
+                            start_num=start_page_num,
+                            backend=merge_backend
                         )
                         
                         st.download_button(
@@ -415,6 +359,7 @@ elif st.session_state.pdf_files:
         with col2:
             if st.button("Clear All", use_container_width=True, help="Remove all files"):
                 st.session_state.pdf_files = []
+                st.session_state.pdf_sources = {}
                 st.session_state.file_uploader_key += 1
                 st.session_state.editing_file_idx = None
                 st.rerun()